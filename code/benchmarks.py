@@ -0,0 +1,859 @@
+"""
+benchmarks.py
+
+Description: Timing comparisons for the collection and analysis pipeline. Run
+as `python benchmarks.py <name>`, e.g. `python benchmarks.py collection`.
+"""
+import random
+import sys
+import time
+
+HASHTAG_ENTITY = "{u'indices': [0, 5], u'text': u'%s'}"
+MENTION_ENTITY = "{u'id': 1, u'indices': [0, 5], u'id_str': u'1', u'screen_name': u'%s', u'name': u'Name'}"
+
+""" Returns a numpy object array of num_statuses generated statuses in the
+column layout of the statuses csv files written by data_collector_timestamps.py,
+with entity lists written the way tweepy's entities print. """
+def synthetic_statuses(num_statuses, num_users=1000, seed=0):
+    import numpy as np
+    rand = random.Random(seed)
+    rows = []
+    for i in range(num_statuses):
+        username = 'user{}'.format(rand.randint(0, num_users))
+        hashtags = [HASHTAG_ENTITY % 'tag{}'.format(rand.randint(0, 200)) for j in range(rand.randint(0, 2))]
+        mentions = [MENTION_ENTITY % 'user{}'.format(rand.randint(0, num_users)) for j in range(rand.randint(0, 3))]
+        text = 'status {}: text'.format(i)
+        if rand.random() < 0.3:
+            text = 'RT @user{}: {}'.format(rand.randint(0, num_users), text)
+        reply_to = 'user{}'.format(rand.randint(0, num_users)) if rand.random() < 0.2 else 'None'
+        time_created = '2016-{:02d}-{:02d} 12:00:00'.format(rand.randint(1, 12), rand.randint(1, 28))
+        rows.append([username, time_created, text, 0, i, '[' + ', '.join(hashtags) + ']', '[' + ', '.join(mentions) + ']', reply_to])
+    return np.array(rows, dtype=object)
+
+""" Compares accounts per hour of the serial collection path (one worker) with
+the concurrent collector on a local FakeTwitterAPI. The fake API's latency and
+rate limit are scaled down so the benchmark runs in seconds. """
+def benchmark_collection(num_accounts=32, num_statuses=600, latency=0.05, num_workers=8):
+    import collector_utils as cutil
+    import concurrent_collector as concurrent
+    from fake_twitter_api import FakeTwitterAPI
+
+    calls_per_window = 200
+    window = 2.0
+    account_names = ['account{}'.format(i) for i in range(num_accounts)]
+    for workers in [1, num_workers]:
+        api = FakeTwitterAPI(num_statuses=num_statuses, latency=latency, calls_per_window=calls_per_window, window=window)
+        scheduler = cutil.RateLimitScheduler(calls_per_window=calls_per_window, window=window, margin=2 * latency)
+        counts = []
+        accounts_per_hour = concurrent.collect_accounts(account_names, api, lambda username, records: counts.append(len(records)), workers, scheduler)
+        print('{} worker(s): {:.0f} accounts/hour, {} statuses, {} API calls, {} rate limit errors'.format(workers, accounts_per_hour, sum(counts), api.num_calls, api.num_rate_limit_errors))
+
+""" Compares API calls and written statuses of a full collection run with a
+daily refresh that resumes from per-account checkpoints. """
+def benchmark_incremental(num_accounts=20, num_statuses=3200, num_new=5):
+    import concurrent_collector as concurrent
+    import os
+    import tempfile
+    from checkpoints import CheckpointStore
+    from fake_twitter_api import FakeTwitterAPI
+
+    account_names = ['account{}'.format(i) for i in range(num_accounts)]
+    api = FakeTwitterAPI(num_statuses=num_statuses, latency=0)
+    path = os.path.join(tempfile.mkdtemp(), 'checkpoints.json')
+    checkpoints = CheckpointStore(path)
+    for run in ['full', 'refresh']:
+        counts = []
+        calls_before = api.num_calls
+        concurrent.collect_accounts(account_names, api, lambda username, records: counts.append(len(records)), checkpoints=checkpoints)
+        print('{} run: {} API calls, {} statuses written'.format(run, api.num_calls - calls_before, sum(counts)))
+        for username in account_names:
+            api.add_statuses(username, num_new)
+
+""" Reports the largest number of status records held in memory at once while
+collecting one account, as the timeline grows. Pages are streamed straight to
+a sink that drops them, so the peak should not depend on the timeline length. """
+def benchmark_streaming(timeline_lengths=[800, 1600, 3200]):
+    import collector_utils as cutil
+    import concurrent_collector as concurrent
+    import gc
+    from fake_twitter_api import FakeTwitterAPI
+
+    for num_statuses in timeline_lengths:
+        api = FakeTwitterAPI(num_statuses=num_statuses, latency=0.01)
+        peak = {'pages': 0, 'records': 0}
+        def handle_page(username, records):
+            peak['pages'] += 1
+            held = sum(1 for obj in gc.get_objects() if isinstance(obj, cutil.StatusRecord))
+            peak['records'] = max(peak['records'], held)
+        concurrent.collect_accounts(['account'], api, handle_page, num_workers=1)
+        print('{} statuses: {} pages, at most {} records held at once'.format(num_statuses, peak['pages'], peak['records']))
+
+""" Compares the insert rate of one INSERT and commit per row (the collector's
+previous write path) with BufferedWriter's one transaction per page, on a local
+SQLite database. """
+def benchmark_writes(num_statuses=2000):
+    import buffered_writer
+    import collector_utils as cutil
+    import os
+    import storage
+    import tempfile
+    from fake_twitter_api import generate_timeline
+
+    records = [cutil.status_record(status) for status in generate_timeline('account', num_statuses)]
+    directory = tempfile.mkdtemp()
+
+    connection = storage.connect_sqlite(os.path.join(directory, 'per_row.db'))
+    start = time.time()
+    num_rows = 0
+    for record in records:
+        status_row, edges = buffered_writer.record_rows(record)
+        rows = [(buffered_writer.STATUS_SQL, status_row)]
+        for table in buffered_writer.EDGE_TABLES:
+            rows += [(buffered_writer.EDGE_SQL.format('`{}`'.format(table)), row) for row in edges[table]]
+        for sql, row in rows:
+            cursor = connection.cursor()
+            cursor.execute(storage.prepare(sql, connection), row)
+            connection.commit()
+            num_rows += 1
+    elapsed = time.time() - start
+    print('per-row commits: {} rows in {:.2f}s, {:.0f} rows/s'.format(num_rows, elapsed, num_rows / elapsed))
+
+    connection = storage.connect_sqlite(os.path.join(directory, 'batched.db'))
+    start = time.time()
+    with buffered_writer.BufferedWriter(connection) as writer:
+        for i in range(0, len(records), cutil.PAGE_SIZE):
+            for record in records[i:i + cutil.PAGE_SIZE]:
+                writer.add_record(record)
+            writer.flush()
+    elapsed = time.time() - start
+    print('batched per page: {} rows in {:.2f}s, {:.0f} rows/s'.format(writer.num_written, elapsed, writer.num_written / elapsed))
+
+""" Times extraction of all four interaction types on growing numbers of
+statuses, with one pass per type and with the single-pass extractor. The time
+per status should stay flat as the input grows. """
+def benchmark_extraction(sizes=[25000, 50000, 100000, 200000]):
+    import edges_from_statuses as efs
+    efs.set_colnames()
+    for num_statuses in sizes:
+        statuses = synthetic_statuses(num_statuses)
+        start = time.time()
+        num_edges = (len(efs.hashtags_from_statuses(statuses)) + len(efs.mentions_from_statuses(statuses)) +
+                     len(efs.retweets_from_statuses(statuses)) + len(efs.replies_from_statuses(statuses)))
+        elapsed = time.time() - start
+        print('{} statuses, separate passes: {} edges in {:.2f}s, {:.2f} us per status'.format(num_statuses, num_edges, elapsed, elapsed * 1e6 / num_statuses))
+        start = time.time()
+        interactions = efs.interactions_from_statuses(statuses)
+        num_edges = sum(len(edges) for edges in interactions.values())
+        elapsed = time.time() - start
+        print('{} statuses, single pass: {} edges in {:.2f}s, {:.2f} us per status'.format(num_statuses, num_edges, elapsed, elapsed * 1e6 / num_statuses))
+
+""" Writes num_statuses generated statuses to a csv file in a temporary
+directory and returns its path. """
+def synthetic_statuses_file(num_statuses):
+    import csv
+    import os
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), 'statuses.csv')
+    with open(path, 'wb') as f:
+        csv.writer(f, lineterminator='\n').writerows(synthetic_statuses(num_statuses))
+    return path
+
+""" Reports the peak memory of writing the edges of statuses files of growing
+size with the chunked reader, for a few chunk sizes, each in a fresh process.
+Peak memory should follow the chunk size, not the file size. """
+def benchmark_chunked(sizes=[100000, 400000], chunk_sizes=[10000, 50000]):
+    import os
+    import subprocess
+    code = ("import edges_from_statuses as efs, resource, sys; efs.set_colnames(); "
+            "efs.edges_to_files(sys.argv[1], sys.argv[1] + '_out', int(sys.argv[2])); "
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    for num_statuses in sizes:
+        path = synthetic_statuses_file(num_statuses)
+        for chunksize in chunk_sizes:
+            start = time.time()
+            peak = subprocess.check_output([sys.executable, '-c', code, path, str(chunksize)]).strip()
+            print('{} statuses ({:.0f} MB), chunks of {}: max RSS {} KB, {:.2f}s'.format(num_statuses, os.path.getsize(path) / 1e6, chunksize, peak, time.time() - start))
+
+""" Times writing the edges of a statuses file with 1 up to num_workers
+processes and checks that every run writes the same files as the serial chunked
+reader. Speedup is bounded by the number of cores. """
+def benchmark_parallel(num_statuses=400000, num_workers=4):
+    import edges_from_statuses as efs
+    import filecmp
+    efs.set_colnames()
+    path = synthetic_statuses_file(num_statuses)
+    start = time.time()
+    efs.edges_to_files(path, path + '_serial')
+    serial = time.time() - start
+    print('serial: {:.2f}s'.format(serial))
+    for workers in range(1, num_workers + 1):
+        start = time.time()
+        efs.edges_to_files_parallel(path, path + '_parallel', workers, shard_bytes=4 * 1024 * 1024)
+        elapsed = time.time() - start
+        same = all(filecmp.cmp('{}_serial_{}_edges.csv'.format(path, t), '{}_parallel_{}_edges.csv'.format(path, t), shallow=False)
+                   for t in efs.INTERACTION_TYPES)
+        print('{} workers: {:.2f}s ({:.1f}x serial), same output: {}'.format(workers, elapsed, serial / elapsed, same))
+
+""" Returns a dataframe of num_edges generated edges between num_users users in
+the layout of graph_utils.get_edge_list, with a few very active users the way
+the real edge tables have. """
+def synthetic_edge_list(num_edges, num_users=5000, seed=0, exponent=1.5):
+    import numpy as np
+    import pandas as pd
+    rand = np.random.RandomState(seed)
+    users = np.array(['user{}'.format(i) for i in range(num_users)], dtype=object)
+    start = np.minimum(rand.zipf(exponent, num_edges), num_users) - 1
+    end = np.minimum(rand.zipf(exponent, num_edges), num_users) - 1
+    return pd.DataFrame({'start_node': users[start], 'end_node': users[end]})
+
+""" The per-row loop graph_creator.create_graph_edge_weights used before
+weights were aggregated in bulk, kept for comparison. """
+def legacy_create_graph_edge_weights(edge_list):
+    import networkx as nx
+    default_weight = 1
+    G = nx.DiGraph()
+    num_edges = edge_list.shape[0]
+    for i in range(num_edges):
+        n0 = edge_list.loc[i, 'start_node']
+        n1 = edge_list.loc[i, 'end_node']
+        # Don't include self-referencing edges
+        if n0 == n1:
+            continue
+        if G.has_edge(n0,n1):
+            G[n0][n1]['weight'] += default_weight
+        else:
+            G.add_edge(n0,n1, weight=default_weight)
+    return G
+
+""" The per-row loop graph_creator.create_undirected_graph_edge_weights used
+before weights were aggregated in bulk, kept for comparison. """
+def legacy_create_undirected_graph_edge_weights(edge_list):
+    import networkx as nx
+    default_weight = 1
+    G = nx.Graph()
+    edge_list.end_node = edge_list.end_node.str.encode('utf-8')
+    for i in range(len(edge_list.index)):
+        n0 = edge_list['start_node'].iloc[i]
+        n1 = edge_list['end_node'].iloc[i]
+        # Don't include self-referencing edges
+        if n0 == n1:
+            continue
+        if G.has_edge(n0,n1):
+            G[n0][n1]['weight'] += default_weight
+        else:
+            G.add_edge(n0,n1, weight=default_weight)
+    return G
+
+""" Compares building weighted graphs with the per-row loop and with bulk
+aggregation, on edge lists about the size of the replies and mentions tables,
+and checks that both build the same graph. """
+def benchmark_graphs(sizes=[50000, 200000]):
+    import graph_creator as gc
+    builders = [('directed', legacy_create_graph_edge_weights, gc.create_graph_edge_weights),
+                ('undirected', legacy_create_undirected_graph_edge_weights, gc.create_undirected_graph_edge_weights)]
+    for num_edges in sizes:
+        for name, legacy, bulk in builders:
+            start = time.time()
+            old_g = legacy(synthetic_edge_list(num_edges))
+            legacy_time = time.time() - start
+            start = time.time()
+            new_g = bulk(synthetic_edge_list(num_edges))
+            bulk_time = time.time() - start
+            same = old_g.nodes() == new_g.nodes() and old_g.edges(data=True) == new_g.edges(data=True)
+            print('{} edges, {}: loop {:.2f}s, bulk {:.3f}s ({:.0f}x), same graph: {}'.format(num_edges, name, legacy_time, bulk_time, legacy_time / bulk_time, same))
+
+""" Compares the memory used by a networkx DiGraph and a CSRGraph of the same
+generated edge list, each built in a fresh process. Activity is spread more
+evenly than in the other benchmarks so that most edges are distinct. """
+def benchmark_csr_memory(num_edges=1000000, num_users=200000, exponent=1.1):
+    import subprocess
+    code = ("import benchmarks, resource, sys, graph_creator as gc; from csr_graph import CSRGraph; "
+            "edge_list = benchmarks.synthetic_edge_list(int(sys.argv[1]), int(sys.argv[2]), exponent=float(sys.argv[4])); "
+            "before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+            "g = gc.create_graph_edge_weights(edge_list) if sys.argv[3] == 'networkx' else CSRGraph.from_edge_list(edge_list); "
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)")
+    for kind in ['networkx', 'csr']:
+        used = subprocess.check_output([sys.executable, '-c', code, str(num_edges), str(num_users), kind, str(exponent)]).strip()
+        print('{}: {} KB for {} edges'.format(kind, used, num_edges))
+    from csr_graph import CSRGraph
+    g = CSRGraph.from_edge_list(synthetic_edge_list(num_edges, num_users, exponent=exponent))
+    print('csr adjacency arrays: {} KB for {} distinct edges, {:.0f} bytes per edge'.format(g.nbytes() // 1024, g.number_of_edges(), g.nbytes() * 1.0 / g.number_of_edges()))
+
+""" Compares common traversals (weighted degrees, a breadth-first search and
+PageRank) on a networkx DiGraph and a CSRGraph of the same edge list. """
+def benchmark_csr_traversal(num_edges=500000, num_users=50000):
+    import graph_creator as gc
+    import networkx as nx
+    from csr_graph import CSRGraph
+    edge_list = synthetic_edge_list(num_edges, num_users)
+    G = gc.create_graph_edge_weights(edge_list)
+    C = CSRGraph.from_edge_list(edge_list)
+    source = C.names[0]
+    tasks = [('out degree', lambda: G.out_degree(weight='weight'), lambda: C.out_degree()),
+             ('in degree', lambda: G.in_degree(weight='weight'), lambda: C.in_degree()),
+             ('bfs', lambda: nx.single_source_shortest_path_length(G, source), lambda: C.bfs_distances(source)),
+             ('pagerank', lambda: nx.pagerank(G), lambda: C.pagerank())]
+    for name, nx_task, csr_task in tasks:
+        start = time.time()
+        nx_task()
+        nx_time = time.time() - start
+        start = time.time()
+        csr_task()
+        csr_time = time.time() - start
+        print('{}: networkx {:.3f}s, csr {:.3f}s ({:.0f}x)'.format(name, nx_time, csr_time, nx_time / max(csr_time, 1e-9)))
+
+""" Compares getting a full graph and a subgraph through graph_cache.GraphCache
+when they are not cached (fetching and building them) and when they are. The
+database is replaced by a generated edge list, with a fixed delay standing in
+for the fetch, until the benchmark returns. """
+def benchmark_graph_cache(num_edges=1000000, num_users=200000, fetch_time=2.0):
+    import graph_cache
+    import graph_utils as util
+    import shutil
+    import tempfile
+    edge_list = synthetic_edge_list(num_edges, num_users, exponent=1.1)
+    def get_edge_list(interaction_type, fingerprint):
+        time.sleep(fetch_time)
+        return edge_list.copy()
+    get_pair_counts = graph_cache.get_pair_counts
+    get_edge_table_fingerprint = util.get_edge_table_fingerprint
+    graph_cache.get_pair_counts = get_edge_list
+    util.get_edge_table_fingerprint = lambda interaction_type: (num_edges, num_edges, 0)
+    directory = tempfile.mkdtemp()
+    try:
+        cache = graph_cache.GraphCache(directory)
+        subset = ['user{}'.format(i) for i in range(0, num_users, 10)]
+        for name, nodes in [('full graph', None), ('subgraph', subset)]:
+            start = time.time()
+            g = cache.get_graph('mentions', nodes)
+            miss_time = time.time() - start
+            start = time.time()
+            cached = cache.get_graph('mentions', nodes)
+            hit_time = time.time() - start
+            same = cached.names == g.names and (cached.out_adj != g.out_adj).nnz == 0
+            print('{} ({} edges): not cached {:.2f}s, cached {:.2f}s, same graph: {}'.format(name, g.number_of_edges(), miss_time, hit_time, same))
+    finally:
+        graph_cache.get_pair_counts = get_pair_counts
+        util.get_edge_table_fingerprint = get_edge_table_fingerprint
+        shutil.rmtree(directory)
+
+""" Compares the six category filters of degree_vectors.degrees_into_database
+done with list scans (as graph_utils.get_edges_to and get_edges_from used to),
+with sets on a networkx graph, and with masks on a CSRGraph. """
+def benchmark_filtering(num_edges=200000, num_users=20000, list_size=1000):
+    import graph_creator as gc
+    import graph_utils as util
+    import networkx as nx
+    import numpy as np
+    from csr_graph import CSRGraph
+    edge_list = synthetic_edge_list(num_edges, num_users, exponent=1.1)
+    G = gc.create_graph_edge_weights(edge_list)
+    C = CSRGraph.from_edge_list(edge_list)
+    users = np.array(['user{}'.format(i) for i in range(num_users)])
+    lists = [users[i::7][:list_size] for i in range(3)]
+    def scan_filters():
+        return [nx.DiGraph([(u,v,d) for u,v,d in G.edges(data=True) if u in nodes]) for nodes in lists] + \
+               [nx.DiGraph([(u,v,d) for u,v,d in G.edges(data=True) if v in nodes]) for nodes in lists]
+    def set_filters():
+        return [util.get_edges_from(G, nodes) for nodes in lists] + [util.get_edges_to(G, nodes) for nodes in lists]
+    def mask_filters():
+        masks = [C.node_mask(nodes) for nodes in lists]
+        return [util.get_edges_from(C, mask) for mask in masks] + [util.get_edges_to(C, mask) for mask in masks]
+    results = []
+    for name, filters in [('list scan', scan_filters), ('set', set_filters), ('csr mask', mask_filters)]:
+        start = time.time()
+        results.append(filters())
+        print('{}: {:.2f}s'.format(name, time.time() - start))
+    edge_sets = [[sorted(g.edges(data=True)) for g in result] for result in results[:2]]
+    edge_sets.append([sorted(g.to_networkx().edges(data=True)) for g in results[2]])
+    print('same edges: {}'.format(edge_sets[0] == edge_sets[1] == edge_sets[2]))
+
+""" Compares building one graph per interaction type and lining up their
+out-degrees by username with building a MultiplexGraph of all types at once and
+reading its degree matrix. """
+def benchmark_multiplex(num_edges=300000, num_users=50000):
+    import graph_creator as gc
+    import numpy as np
+    import pandas as pd
+    from multiplex_graph import MultiplexGraph
+    interaction_types = ['hashtags', 'mentions', 'replies', 'retweets']
+    edge_lists = dict((t, synthetic_edge_list(num_edges, num_users, seed=i, exponent=1.1)) for i, t in enumerate(interaction_types))
+    combined = pd.concat([edge_lists[t].assign(interaction_type=t) for t in interaction_types], ignore_index=True)
+
+    start = time.time()
+    graphs = dict((t, gc.create_graph_edge_weights(edge_lists[t])) for t in interaction_types)
+    names = sorted(set().union(*[g.nodes() for g in graphs.values()]))
+    degrees = [graphs[t].out_degree(weight='weight') for t in interaction_types]
+    separate = np.array([[d.get(name, 0) for d in degrees] for name in names])
+    separate_time = time.time() - start
+
+    start = time.time()
+    multiplex = MultiplexGraph.from_edge_list(combined, interaction_types)
+    degree_matrix = multiplex.degree_matrix()
+    multiplex_time = time.time() - start
+
+    order = np.argsort(np.array(multiplex.names, dtype=object))
+    same = np.array_equal(degree_matrix[order], separate)
+    print('separate graphs: {:.2f}s, multiplex: {:.2f}s ({:.0f}x), same degrees: {}'.format(separate_time, multiplex_time, separate_time / multiplex_time, same))
+
+""" Compares moving a 30-day window over a year of generated edges one day at a
+time with temporal_graph and rebuilding each window's graph from its edges. """
+def benchmark_windows(num_edges=1000000, num_users=50000, num_days=365):
+    import numpy as np
+    import pandas as pd
+    from csr_graph import CSRGraph
+    from temporal_graph import TemporalGraph
+    edge_list = synthetic_edge_list(num_edges, num_users, exponent=1.1)
+    rand = np.random.RandomState(0)
+    edge_list['time_created'] = pd.Timestamp('2016-01-01') + pd.to_timedelta(rand.randint(0, num_days * 86400, num_edges), unit='s')
+    temporal = TemporalGraph(edge_list)
+
+    start = time.time()
+    incremental = [snapshot.number_of_edges() for snapshot in temporal.windows('30D', '1D')]
+    incremental_time = time.time() - start
+
+    start = time.time()
+    rebuilt = []
+    window_start = pd.Timestamp('2016-01-01')
+    for i in range(len(incremental)):
+        in_window = (edge_list['time_created'] >= window_start) & (edge_list['time_created'] < window_start + pd.Timedelta(days=30))
+        rebuilt.append(CSRGraph.from_edge_list(edge_list[in_window]).number_of_edges())
+        window_start += pd.Timedelta(days=1)
+    rebuild_time = time.time() - start
+    print('{} windows: incremental {:.2f}s ({:.1f} ms per step), rebuilt {:.2f}s, same edge counts: {}'.format(
+        len(incremental), incremental_time, 1000 * incremental_time / len(incremental), rebuild_time, incremental == rebuilt))
+
+""" Times building a time-decayed graph of a generated edge list in one pass,
+then adding a day's worth of new interactions to it, compared with rebuilding
+it with those interactions. """
+def benchmark_decay(num_edges=1000000, num_users=50000, num_new=3000):
+    import numpy as np
+    import pandas as pd
+    from decayed_graph import DecayedGraph
+    edge_list = synthetic_edge_list(num_edges + num_new, num_users, exponent=1.1)
+    rand = np.random.RandomState(0)
+    edge_list['time_created'] = pd.Timestamp('2012-01-01') + pd.to_timedelta(np.sort(rand.randint(0, 5 * 365 * 86400, len(edge_list))), unit='s')
+    old_edges = edge_list.iloc[:num_edges]
+    new_edges = edge_list.iloc[num_edges:]
+
+    start = time.time()
+    g = DecayedGraph.from_edge_list(old_edges)
+    g.graph()
+    print('build {} edges: {:.2f}s'.format(num_edges, time.time() - start))
+    start = time.time()
+    g.add_edges(new_edges)
+    print('add {} edges: {:.4f}s'.format(num_new, time.time() - start))
+    start = time.time()
+    DecayedGraph.from_edge_list(edge_list).graph()
+    print('rebuild with them: {:.2f}s'.format(time.time() - start))
+
+""" Compares labeling users with categories by scanning the category lists (as
+the add_types functions used to) with user_categories.UserCategories. """
+def benchmark_categories(num_users=20000, list_size=2000):
+    from user_categories import UserCategories
+    users = ['user{}'.format(i) for i in range(num_users)]
+    c_list, m_list, p_list = users[0::7][:list_size], users[1::7][:list_size], users[2::7][:list_size]
+    start = time.time()
+    scanned = []
+    for user in users:
+        if user in c_list:
+            scanned.append('c')
+        elif user in p_list:
+            scanned.append('p')
+        elif user in m_list:
+            scanned.append('m')
+        else:
+            scanned.append('o')
+    scan_time = time.time() - start
+    start = time.time()
+    categories = UserCategories(c_list, m_list, p_list)
+    build_time = time.time() - start
+    start = time.time()
+    types = categories.types(users)
+    label_time = time.time() - start
+    print('{} users: list scans {:.2f}s, registry build {:.4f}s + labeling {:.4f}s, same labels: {}'.format(
+        num_users, scan_time, build_time, label_time, list(types) == scanned))
+
+""" Compares normalizing the node names of an edge list the way graph_utils
+used to (one lambda call per row) with usernames.normalize_names, and the size
+of the normalized string columns with int32 ids from a UsernameTable. Then
+loads a multiplex graph of the edges from a local SQLite stand-in for the
+database, from an edge list of names and from ids in a persisted UsernameTable
+(twice, the second time with every name already in the table). """
+def benchmark_normalization(num_edges=1000000, num_users=50000):
+    import graph_utils as util
+    import numpy as np
+    import os
+    import pandas as pd
+    import storage
+    import tempfile
+    import usernames
+    from multiplex_graph import MultiplexGraph
+    edge_list = synthetic_edge_list(num_edges, num_users, exponent=1.1)
+    raw = edge_list.apply(lambda column: column.map(lambda name: name.upper().decode('ascii')))
+
+    start = time.time()
+    old = raw.copy()
+    old['start_node'] = map(lambda x: str(x).lower(), old['start_node'])
+    old.end_node = old.end_node.str.encode("ascii", "ignore")
+    old['end_node'] = map(lambda x: str(x).lower(), old['end_node'])
+    old_time = time.time() - start
+
+    start = time.time()
+    start_nodes = usernames.normalize_names(raw['start_node'].values)
+    end_nodes = usernames.normalize_names(raw['end_node'].values, ascii_only=True)
+    new_time = time.time() - start
+    same = np.array_equal(old['start_node'].values, start_nodes) and np.array_equal(old['end_node'].values, end_nodes)
+    print('{} edges: per-row normalization {:.2f}s, per-name {:.2f}s, same names: {}'.format(num_edges, old_time, new_time, same))
+
+    table = usernames.UsernameTable(None)
+    start = time.time()
+    start_ids = table.ids(start_nodes)
+    end_ids = table.ids(end_nodes)
+    print('interning: {:.2f}s for {} names'.format(time.time() - start, len(table)))
+    string_bytes = old.memory_usage(index=False, deep=True).sum()
+    print('normalized columns: {:.1f} MB as strings, {:.1f} MB as int32 ids'.format(string_bytes / 1e6, (start_ids.nbytes + end_ids.nbytes) / 1e6))
+
+    directory = tempfile.mkdtemp()
+    storage.configure('sqlite:' + os.path.join(directory, 'iw03.db'))
+    interaction_types = sorted(storage.EDGE_TYPES)
+    with storage.connection() as connection:
+        with connection.cursor() as cursor:
+            for i, interaction_type in enumerate(interaction_types):
+                part = raw.iloc[i::len(interaction_types)]
+                rows = zip(part['start_node'].tolist(), part['end_node'].tolist(), ['2016-06-01 12:00:00'] * len(part))
+                cursor.executemany("INSERT INTO `{}_edges` (`start_node`, `end_node`, `time_created`) VALUES (%s, %s, %s)".format(interaction_type), rows)
+        connection.commit()
+    start = time.time()
+    by_names = MultiplexGraph.from_edge_list(util.get_multiplex_edge_list(interaction_types), interaction_types)
+    print('multiplex graph from names: {:.2f}s'.format(time.time() - start))
+    expected = by_names.degree_matrix()[np.argsort(np.array(by_names.names, dtype=object))]
+    for run in ['first', 'second']:
+        start = time.time()
+        by_ids = MultiplexGraph.from_database(interaction_types, usernames.UsernameTable(os.path.join(directory, usernames.ID_FILE)))
+        elapsed = time.time() - start
+        same = np.array_equal(by_ids.degree_matrix()[np.argsort(np.array(by_ids.names, dtype=object))], expected)
+        print('multiplex graph from interned ids ({} load): {:.2f}s, same degrees: {}'.format(run, elapsed, same))
+    storage.get_pool().close()
+
+""" Compares a run of the small queries a clustering run makes (edge table
+fingerprints for the graph cache and the category lists) with a new connection
+per query, as graph_utils used to open, and with storage's pooled connections,
+on a local SQLite stand-in for the database. Prints the recorded connection and
+query latencies of both. """
+def benchmark_storage(num_edges=20000, num_users=5000, num_calls=500):
+    import graph_utils as util
+    import os
+    import storage
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), 'iw03.db')
+    edge_list = synthetic_edge_list(num_edges, num_users)
+    connection = storage.connect_sqlite(path)
+    rows = zip(edge_list['start_node'].tolist(), edge_list['end_node'].tolist(), ['2016-06-01 12:00:00'] * num_edges)
+    connection.executemany("INSERT INTO `mentions_edges` (`start_node`, `end_node`, `time_created`) VALUES (?, ?, ?)", rows)
+    for i, table in enumerate(['c_list', 'm_list', 'p_list']):
+        connection.executemany("INSERT INTO `{}` (`name`) VALUES (?)".format(table), [('user{}'.format(j),) for j in range(i, num_users, 50)])
+    connection.commit()
+    connection.close()
+
+    for name, max_idle in [('connection per query', 0), ('pooled', storage.MAX_IDLE)]:
+        storage.configure('sqlite:' + path, max_idle)
+        start = time.time()
+        for i in range(num_calls):
+            util.get_edge_table_fingerprint('mentions')
+            util.get_lists()
+        elapsed = time.time() - start
+        print('{}: {} calls in {:.2f}s'.format(name, 2 * num_calls, elapsed))
+        print(storage.latency_stats().report())
+
+    start = time.time()
+    edge_list = util.get_edge_list('mentions')
+    print('get_edge_list from SQLite: {} edges in {:.2f}s'.format(len(edge_list), time.time() - start))
+    storage.get_pool().close()
+
+""" Compares fetching an edge table with fetchall into one dictionary per row
+(as get_edge_list did with a DictCursor) and with graph_utils' streaming
+batches, on a local SQLite stand-in for the database. Each runs in a fresh
+process, which reports its peak memory and the time until the first edges
+were available. """
+def benchmark_edge_fetch(num_edges=1000000, num_users=50000):
+    import os
+    import storage
+    import subprocess
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), 'iw03.db')
+    edge_list = synthetic_edge_list(num_edges, num_users)
+    connection = storage.connect_sqlite(path)
+    rows = zip(edge_list['start_node'].tolist(), edge_list['end_node'].tolist(), ['2016-06-01 12:00:00'] * num_edges)
+    connection.executemany("INSERT INTO `mentions_edges` (`start_node`, `end_node`, `time_created`) VALUES (?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+    del edge_list, rows
+
+    code = ("import resource, storage, sys, time, pandas as pd, graph_utils as util; storage.configure('sqlite:' + sys.argv[1]); "
+            "before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; start = time.time()\n"
+            "if sys.argv[2] == 'fetchall':\n"
+            "    connection = storage.get_pool().acquire().connection; columns = ['start_node', 'end_node']\n"
+            "    connection.row_factory = lambda cursor, row: dict(zip(columns, row))\n"
+            "    results = connection.execute('SELECT `start_node`, `end_node` FROM mentions_edges').fetchall(); first = time.time() - start\n"
+            "    edge_list = util.normalize_edge_list(pd.DataFrame(results, columns=columns))\n"
+            "else:\n"
+            "    batches = util.iter_edge_batches('mentions'); edge_list = [next(batches)]; first = time.time() - start\n"
+            "    edge_list = pd.concat(edge_list + list(batches), ignore_index=True)\n"
+            "print('{} edges in {:.2f}s, first edges after {:.2f}s, {} KB'.format(len(edge_list), time.time() - start, first, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before))")
+    for kind in ['fetchall', 'streaming']:
+        print('{}: {}'.format(kind, subprocess.check_output([sys.executable, '-c', code, path, kind]).strip()))
+
+""" Compares building the weighted graph of an edge table from every
+interaction row (get_edge_list) and from the pair counts computed by the
+database (get_weighted_edge_list), on a local SQLite stand-in for the database
+with the indexes of storage.add_edge_indexes. """
+def benchmark_pushdown(num_edges=1000000, num_users=20000):
+    import graph_utils as util
+    import os
+    import storage
+    import tempfile
+    from csr_graph import CSRGraph
+
+    path = os.path.join(tempfile.mkdtemp(), 'iw03.db')
+    edge_list = synthetic_edge_list(num_edges, num_users)
+    connection = storage.connect_sqlite(path)
+    rows = zip(edge_list['start_node'].tolist(), edge_list['end_node'].tolist(), ['2016-06-01 12:00:00'] * num_edges)
+    connection.executemany("INSERT INTO `mentions_edges` (`start_node`, `end_node`, `time_created`) VALUES (?, ?, ?)", rows)
+    storage.add_edge_indexes(connection)
+    connection.close()
+    storage.configure('sqlite:' + path)
+
+    start = time.time()
+    rows = util.get_edge_list('mentions')
+    g = CSRGraph.from_edge_list(rows)
+    rows_time = time.time() - start
+    start = time.time()
+    pairs = util.get_weighted_edge_list('mentions')
+    weighted = CSRGraph.from_edge_list(pairs)
+    pairs_time = time.time() - start
+    same = sorted(g.to_networkx().edges(data=True)) == sorted(weighted.to_networkx().edges(data=True))
+    print('interaction rows: {} rows in {:.2f}s'.format(len(rows), rows_time))
+    print('pair counts: {} rows ({:.1f}x fewer) in {:.2f}s, same graph: {}'.format(len(pairs), len(rows) * 1.0 / len(pairs), pairs_time, same))
+    storage.get_pool().close()
+
+""" Compares reading the pair counts of an edge table computed by the database
+from the raw rows (graph_utils.get_weighted_edge_list, with the indexes of
+storage.add_edge_indexes) and from the edge_pair_counts rollup, on a local
+SQLite stand-in for the database. Also times rebuilding the rollups and
+checking them, and building a graph in graph_cache.GraphCache from the rollup
+and, once the rollup is out of date, from the GROUP BY fallback. """
+def benchmark_rollups(num_edges=1000000, num_users=20000):
+    import graph_cache
+    import graph_utils as util
+    import os
+    import rollups
+    import storage
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), 'iw03.db')
+    edge_list = synthetic_edge_list(num_edges, num_users)
+    connection = storage.connect_sqlite(path)
+    rows = zip(edge_list['start_node'].tolist(), edge_list['end_node'].tolist(), ['2016-06-01 12:00:00'] * num_edges)
+    connection.executemany("INSERT INTO `mentions_edges` (`start_node`, `end_node`, `time_created`) VALUES (?, ?, ?)", rows)
+    storage.add_edge_indexes(connection)
+    connection.close()
+    storage.configure('sqlite:' + path)
+
+    start = time.time()
+    rollups.rebuild('mentions')
+    print('rebuild: {:.2f}s'.format(time.time() - start))
+    start = time.time()
+    pairs = util.get_weighted_edge_list('mentions')
+    pushdown_time = time.time() - start
+    start = time.time()
+    rollup = rollups.get_weighted_edge_list('mentions')
+    rollup_time = time.time() - start
+    same = sorted(pairs.values.tolist()) == sorted(rollup.values.tolist())
+    print('pair counts of {} edges: GROUP BY {:.2f}s, rollup {:.2f}s ({:.1f}x), same pairs: {}'.format(num_edges, pushdown_time, rollup_time, pushdown_time / rollup_time, same))
+    start = time.time()
+    differences = rollups.check('mentions')
+    print('check: {:.2f}s, {} differences'.format(time.time() - start, sum(sum(counts.values()) for counts in differences.values())))
+    graphs = {}
+    for source in ['rollup', 'GROUP BY']:
+        if source == 'GROUP BY':
+            with storage.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("UPDATE `edge_pair_counts` SET `weight` = `weight` + 1 WHERE `start_node` = %s", ('user0',))
+                connection.commit()
+        start = time.time()
+        graphs[source] = graph_cache.GraphCache(tempfile.mkdtemp()).get_graph('mentions')
+        print('uncached graph from {}: {:.2f}s'.format(source, time.time() - start))
+    g, h = graphs['rollup'], graphs['GROUP BY']
+    same = dict(zip(g.names, g.out_degree())) == dict(zip(h.names, h.out_degree())) and dict(zip(g.names, g.in_degree())) == dict(zip(h.names, h.in_degree()))
+    print('same degrees: {}'.format(same))
+    storage.get_pool().close()
+
+""" Compares the degree vectors of degree_vectors.degrees_into_database
+computed from six filtered networkx subgraphs, as it used to, and from two
+sparse matrix products (graph_utils.get_degree_vectors). """
+def benchmark_degree_vectors(num_edges=1000000, num_users=100000, list_size=2000):
+    import graph_creator as gc
+    import graph_utils as util
+    import numpy as np
+    from csr_graph import CSRGraph
+    edge_list = synthetic_edge_list(num_edges, num_users, exponent=1.1)
+    G = gc.create_graph_edge_weights(edge_list)
+    C = CSRGraph.from_edge_list(edge_list)
+    users = np.array(['user{}'.format(i) for i in range(num_users)])
+    c_list, m_list, p_list = [users[i::7][:list_size].tolist() for i in range(3)]
+
+    start = time.time()
+    columns = {}
+    for category, nodes in [('p', p_list), ('m', m_list), ('c', c_list)]:
+        columns['{}_indeg'.format(category)] = util.get_edges_from(G, nodes).in_degree(weight='weight')
+        columns['{}_outdeg'.format(category)] = util.get_edges_to(G, nodes).out_degree(weight='weight')
+    columns['t_outdeg'] = G.out_degree(weight='weight')
+    subgraph_time = time.time() - start
+
+    start = time.time()
+    vectors = util.get_degree_vectors(C, c_list, m_list, p_list)
+    sparse_time = time.time() - start
+    vectors = vectors.set_index('name')
+    same = all((vectors[column] == vectors.index.map(lambda name: degrees.get(name, 0))).all() for column, degrees in columns.items())
+    print('{} nodes: subgraphs {:.2f}s, sparse products {:.3f}s ({:.0f}x), same degrees: {}'.format(len(vectors), subgraph_time, sparse_time, subgraph_time / sparse_time, same))
+
+""" Writes degree vectors the way degree_vectors.degrees_into_database used
+to: an INSERT per name, UPDATEs typing the users in each list table, and an
+UPDATE per node and degree column. """
+def legacy_write_degree_vectors(connection, vectors, table_name):
+    import graph_utils as util
+    nodes = vectors['name'].tolist()
+    with connection.cursor() as cursor:
+        for node in nodes:
+            cursor.execute("INSERT INTO {} (`name`) VALUES (%s)".format(table_name), (node))
+        cursor.execute("UPDATE {} SET `type`=%s".format(table_name), ('o'))
+        for category in ['c', 'm', 'p']:
+            cursor.execute("UPDATE {} SET `type`=%s WHERE name IN (SELECT name FROM {}_list)".format(table_name, category), (category))
+        for column in util.DEGREE_COLUMNS:
+            sql = "UPDATE {} SET `{}`=%s WHERE `name`=%s".format(table_name, column)
+            for key, value in zip(nodes, vectors[column].tolist()):
+                cursor.execute(sql, (value, key))
+    connection.commit()
+
+""" Compares writing the degree vectors of a graph with a statement per value
+(legacy_write_degree_vectors) and with graph_utils.write_degree_vectors, on a
+local SQLite stand-in for the database. """
+def benchmark_vector_writes(num_edges=500000, num_users=50000, list_size=2000):
+    import graph_utils as util
+    import numpy as np
+    import os
+    import storage
+    import tempfile
+    from csr_graph import CSRGraph
+
+    C = CSRGraph.from_edge_list(synthetic_edge_list(num_edges, num_users, exponent=1.1))
+    users = np.array(['user{}'.format(i) for i in range(num_users)])
+    c_list, m_list, p_list = [users[i::7][:list_size].tolist() for i in range(3)]
+    m_list += c_list[:100] # users in several lists
+    p_list += c_list[50:150] + m_list[:100]
+    vectors = util.get_degree_vectors(C, c_list, m_list, p_list)
+    storage.configure('sqlite:' + os.path.join(tempfile.mkdtemp(), 'iw03.db'))
+    with storage.connection() as connection:
+        for category, nodes in [('c', c_list), ('m', m_list), ('p', p_list)]:
+            connection.executemany("INSERT INTO `{}_list` (`name`) VALUES (?)".format(category), [(node,) for node in nodes])
+        connection.commit()
+        start = time.time()
+        legacy_write_degree_vectors(connection, vectors, '`mentionsvectors`')
+        legacy_time = time.time() - start
+        legacy_rows = connection.execute("SELECT * FROM `mentionsvectors` ORDER BY `name`").fetchall()
+    start = time.time()
+    util.write_degree_vectors(vectors, c_list, m_list, p_list, '`mentionsvectors`')
+    bulk_time = time.time() - start
+    with storage.connection() as connection:
+        bulk_rows = connection.execute("SELECT * FROM `mentionsvectors` ORDER BY `name`").fetchall()
+    same = [row[1:] for row in legacy_rows] == [row[1:] for row in bulk_rows]
+    print('{} vectors: statement per value {:.2f}s, bulk {:.2f}s ({:.0f}x), same rows: {}'.format(len(vectors), legacy_time, bulk_time, legacy_time / bulk_time, same))
+    storage.get_pool().close()
+
+""" Compares bringing a degree vector table up to date with a batch of new
+edges by recomputing and rewriting every vector and by adding the batch's
+deltas (incremental_degrees), on a local SQLite stand-in for the database.
+Both must leave the same table. Also applies the new edges in batches to
+vectors held in memory (incremental_degrees.DegreeVectors), which must match
+the recompute too. """
+def benchmark_vector_updates(num_edges=1000000, num_users=100000, num_new=3000, list_size=2000, num_batches=10):
+    import graph_utils as util
+    import incremental_degrees as inc
+    import numpy as np
+    import os
+    import storage
+    import tempfile
+    from csr_graph import CSRGraph
+
+    edge_list = synthetic_edge_list(num_edges + num_new, num_users, exponent=1.1)
+    old_edges = edge_list[:num_edges]
+    new_edges = edge_list[num_edges:]
+    users = np.array(['user{}'.format(i) for i in range(num_users)])
+    c_list, m_list, p_list = [users[i::7][:list_size].tolist() for i in range(3)]
+    storage.configure('sqlite:' + os.path.join(tempfile.mkdtemp(), 'iw03.db'))
+    util.write_degree_vectors(util.get_degree_vectors(CSRGraph.from_edge_list(old_edges), c_list, m_list, p_list), c_list, m_list, p_list, '`mentionsvectors`')
+
+    start = time.time()
+    expected = util.get_degree_vectors(CSRGraph.from_edge_list(edge_list), c_list, m_list, p_list)
+    util.write_degree_vectors(expected, c_list, m_list, p_list, '`retweetsvectors`')
+    full_time = time.time() - start
+    start = time.time()
+    deltas = inc.degree_deltas(new_edges, c_list, m_list, p_list)
+    inc.write_deltas(deltas, c_list, m_list, p_list, '`mentionsvectors`')
+    incremental_time = time.time() - start
+    expected['type'] = util.get_vector_types(expected['name'].values, c_list, m_list, p_list)
+    differences = inc.compare_vectors(expected, inc.read_vectors('`mentionsvectors`'))
+    print('{} new edges ({} users) on {} edges: recompute {:.2f}s, incremental {:.3f}s ({:.0f}x), differences: {}'.format(
+        num_new, len(deltas), num_edges, full_time, incremental_time, full_time / incremental_time, sum(differences.values())))
+
+    vectors = inc.DegreeVectors.from_frame(util.get_degree_vectors(CSRGraph.from_edge_list(old_edges), c_list, m_list, p_list), c_list, m_list, p_list)
+    start = time.time()
+    for i in range(num_batches):
+        vectors.update(new_edges[i::num_batches])
+    memory_time = time.time() - start
+    in_memory = vectors.to_frame()
+    in_memory['type'] = util.get_vector_types(in_memory['name'].values, c_list, m_list, p_list)
+    differences = inc.compare_vectors(expected, in_memory)
+    print('in memory, {} batches: {:.3f}s, differences: {}'.format(num_batches, memory_time, sum(differences.values())))
+    storage.get_pool().close()
+
+BENCHMARKS = {
+    'categories': benchmark_categories,
+    'chunked': benchmark_chunked,
+    'collection': benchmark_collection,
+    'csr_memory': benchmark_csr_memory,
+    'decay': benchmark_decay,
+    'degree_vectors': benchmark_degree_vectors,
+    'csr_traversal': benchmark_csr_traversal,
+    'edge_fetch': benchmark_edge_fetch,
+    'extraction': benchmark_extraction,
+    'filtering': benchmark_filtering,
+    'graph_cache': benchmark_graph_cache,
+    'graphs': benchmark_graphs,
+    'incremental': benchmark_incremental,
+    'multiplex': benchmark_multiplex,
+    'normalization': benchmark_normalization,
+    'parallel': benchmark_parallel,
+    'pushdown': benchmark_pushdown,
+    'rollups': benchmark_rollups,
+    'storage': benchmark_storage,
+    'streaming': benchmark_streaming,
+    'vector_updates': benchmark_vector_updates,
+    'vector_writes': benchmark_vector_writes,
+    'windows': benchmark_windows,
+    'writes': benchmark_writes,
+}
+
+def main():
+    names = sys.argv[1:] if len(sys.argv) > 1 else sorted(BENCHMARKS.keys())
+    for name in names:
+        print('********************{}********************'.format(name))
+        start = time.time()
+        BENCHMARKS[name]()
+        print('{} took {:.2f}s'.format(name, time.time() - start))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+buffered_writer.py
+
+Description: Writes collected statuses and their interaction edges to the
+database in batches, with one executemany per table and one commit per batch
+instead of one INSERT and commit per row. Statuses already in the database are
+skipped together with their edges. The rollup tables (see rollups.py) are
+updated in the same transaction.
+"""
+import rollups
+import storage
+
+STATUS_SQL = "INSERT IGNORE INTO `statuses` (`name`, `time_created`, `text`, `favorite_count`, `status_id`) VALUES (%s, %s, %s, %s, %s)"
+EDGE_SQL = "INSERT INTO {} (`start_node`, `end_node`, `time_created`) VALUES (%s, %s, %s)"
+STATUS_IDS_SQL = "SELECT `status_id` FROM `statuses` WHERE `status_id` IN ({})"
+EDGE_TABLES = ['mentions_edges', 'retweets_edges', 'replies_edges', 'hashtags_edges']
+ID_BATCH_SIZE = 500 # Status ids per lookup of stored statuses
+
+""" Returns the statuses row and a dictionary of edge rows for each edge table
+of a status record (see collector_utils.StatusRecord). """
+def record_rows(record):
+    username = record.name
+    time_created = record.time_created
+    edges = {}
+    edges['mentions_edges'] = [(username, user_mention['screen_name'], time_created) for user_mention in record.user_mentions]
+    edges['retweets_edges'] = [(username, record.retweet_of, time_created)] if record.retweet_of != None else []
+    edges['replies_edges'] = [(username, record.reply_to, time_created)] if record.reply_to != None else []
+    edges['hashtags_edges'] = [(username, hashtag['text'].encode('utf-8'), time_created) for hashtag in record.hashtags]
+    return (username, time_created, record.text, record.favorite_count, record.id), edges
+
+""" Buffers status and edge rows and writes them in a single transaction when
+flush() is called, or whenever batch_size rows are pending. Used as a context
+manager, it flushes whatever is still buffered when the block exits, including
+on errors. num_written counts the rows actually inserted. """
+class BufferedWriter(object):
+    def __init__(self, connection, batch_size=None):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.records = [] # (status row, edge rows) of each buffered record
+        self.num_pending = 0
+        self.num_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
+    """ Adds the status and interaction edges of a status record. A batch is
+    only written between records, so a record is never split across
+    transactions. """
+    def add_record(self, record):
+        status_row, edges = record_rows(record)
+        self.records.append((status_row, edges))
+        self.num_pending += 1 + sum(len(rows) for rows in edges.values())
+        if self.batch_size is not None and self.num_pending >= self.batch_size:
+            self.flush()
+
+    """ Returns the ids in a list of status ids that are already in the
+    statuses table. """
+    def stored_ids(self, cursor, status_ids):
+        stored = set()
+        for i in range(0, len(status_ids), ID_BATCH_SIZE):
+            batch = tuple(status_ids[i:i + ID_BATCH_SIZE])
+            cursor.execute(storage.prepare(STATUS_IDS_SQL.format(', '.join(['%s'] * len(batch))), self.connection), batch)
+            stored.update(int(row[0]) for row in cursor.fetchall())
+        return stored
+
+    """ Writes the buffered records whose statuses are not in the database yet,
+    and adds their edges to the rollup tables, in one transaction. A status
+    that was retrieved again, or appears twice in the buffer, is written once
+    and its edges with it. """
+    def flush(self):
+        if self.num_pending == 0:
+            return
+        rows = {}
+        rollup_counts = rollups.RollupCounts()
+        cursor = self.connection.cursor()
+        try:
+            stored = self.stored_ids(cursor, [status_row[4] for status_row, edges in self.records])
+            for status_row, edges in self.records:
+                if status_row[4] in stored:
+                    continue
+                stored.add(status_row[4])
+                rows.setdefault(STATUS_SQL, []).append(status_row)
+                for table in EDGE_TABLES:
+                    for row in edges[table]:
+                        rows.setdefault(EDGE_SQL.format('`{}`'.format(table)), []).append(row)
+                        rollup_counts.add(table, row)
+            for sql, batch in rows.items():
+                cursor.executemany(storage.prepare(sql, self.connection), batch)
+            rollup_counts.write(cursor, self.connection)
+            self.connection.commit()
+        except:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+        self.num_written += sum(len(batch) for batch in rows.values())
+        self.records = []
+        self.num_pending = 0
@@ -0,0 +1,135 @@
+"""
+bulk_loader.py
+
+Description: Loads the csv files written by data_collector_timestamps.py
+(<prefix>_statuses_timestamps.csv, <prefix>_mentions_timestamps.csv, ...) into
+the statuses and *_edges tables. Statuses already in the database, or seen
+earlier in the file, are skipped together with their edges. The rollup tables
+(see rollups.py) are updated in the same transaction.
+
+Usage: python bulk_loader.py <prefix> [<sqlite file>]
+Without a SQLite file, loads into the database configured for storage.py.
+"""
+import buffered_writer
+import csv
+import rollups
+import storage
+import sys
+import time
+
+BATCH_SIZE = 10000 # Rows per executemany call
+STATUS_ID_COL = 4 # Column of the status id in the statuses csv file
+EDGE_STATUS_ID_COL = 3 # Column of the status id in the edges csv files
+EDGE_POSITION_COL = 4 # Column of an edge's position among its status's edges
+
+""" Returns the names of the csv files written for a given prefix. """
+def csv_file_names(prefix):
+    names = {'statuses': '{}_statuses_timestamps.csv'.format(prefix)}
+    for table in buffered_writer.EDGE_TABLES:
+        interaction_type = table[:-len('_edges')]
+        names[table] = '{}_{}_timestamps.csv'.format(prefix, interaction_type)
+    return names
+
+""" Returns the set of status ids already in the database. """
+def get_status_ids(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT `status_id` FROM `statuses` WHERE `status_id` IS NOT NULL")
+        return set(int(row[0]) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+""" Inserts rows from an iterator in batches of BATCH_SIZE, without
+committing. pymysql sends each batch as one multi-row INSERT. Returns the
+number of rows inserted. """
+def insert_rows(cursor, sql, rows):
+    num_rows = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            num_rows += len(batch)
+            batch = []
+    if len(batch) > 0:
+        cursor.executemany(sql, batch)
+        num_rows += len(batch)
+    return num_rows
+
+""" Yields the rows of the statuses csv file whose status ids are not in
+status_ids, adding the id of each one to new_ids and its (name, time_created)
+to new_keys so their edges can be found. """
+def new_status_rows(statuses_file, status_ids, new_ids, new_keys):
+    for row in csv.reader(statuses_file):
+        status_id = int(row[STATUS_ID_COL])
+        if status_id in status_ids:
+            continue
+        status_ids.add(status_id)
+        new_ids.add(status_id)
+        new_keys.add((row[0], row[1]))
+        yield (row[0], row[1], row[2], row[3], status_id)
+
+""" Yields the rows of an edges csv file that belong to new statuses. Edges are
+matched to statuses by status id, and only the edges written with the first
+occurrence of a status are yielded: a later occurrence starts again at
+position 0. Files written before edges carried status ids are matched by name
+and time created, which cannot tell apart a user's statuses created in the
+same second or skip the edges of a status written twice. """
+def new_edge_rows(edges_file, new_ids, new_keys):
+    next_positions = {} # position of the next edge of each new status
+    for row in csv.reader(edges_file):
+        if len(row) > EDGE_POSITION_COL:
+            status_id = int(row[EDGE_STATUS_ID_COL])
+            position = int(row[EDGE_POSITION_COL])
+            if status_id not in new_ids or position < next_positions.get(status_id, 0):
+                continue
+            next_positions[status_id] = position + 1
+        elif (row[0], row[2]) not in new_keys:
+            continue
+        yield (row[0], row[1], row[2])
+
+""" Loads the csv files of a given prefix in one transaction and returns the
+number of rows inserted into each table. """
+def load_files(connection, prefix):
+    file_names = csv_file_names(prefix)
+    storage.add_status_ids(connection)
+    rollups.create_tables(connection)
+    status_ids = get_status_ids(connection)
+    new_ids = set()
+    new_keys = set()
+    counts = {}
+    rollup_counts = rollups.RollupCounts()
+    cursor = connection.cursor()
+    try:
+        with open(file_names['statuses'], 'rb') as f:
+            sql = storage.prepare(buffered_writer.STATUS_SQL, connection)
+            counts['statuses'] = insert_rows(cursor, sql, new_status_rows(f, status_ids, new_ids, new_keys))
+        for table in buffered_writer.EDGE_TABLES:
+            with open(file_names[table], 'rb') as f:
+                sql = storage.prepare(buffered_writer.EDGE_SQL.format('`{}`'.format(table)), connection)
+                counts[table] = insert_rows(cursor, sql, rollup_counts.track(table, new_edge_rows(f, new_ids, new_keys)))
+        rollup_counts.write(cursor, connection)
+        connection.commit()
+    except:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return counts
+
+def main():
+    prefix = sys.argv[1]
+    if len(sys.argv) > 2:
+        storage.configure('sqlite:' + sys.argv[2])
+    with storage.connection() as connection:
+        start = time.time()
+        counts = load_files(connection, prefix)
+        elapsed = time.time() - start
+        storage.add_edge_indexes(connection)
+    for table in ['statuses'] + buffered_writer.EDGE_TABLES:
+        print('{}: {} rows'.format(table, counts[table]))
+    num_rows = sum(counts.values())
+    print('Loaded {} rows in {:.2f}s ({:.0f} rows per second)'.format(num_rows, elapsed, num_rows / max(elapsed, 1e-9)))
+
+if __name__ == "__main__":
+    main()
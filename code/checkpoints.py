@@ -0,0 +1,66 @@
+"""
+checkpoints.py
+
+Description: Records, for each account, the newest and oldest status ids that
+have been collected, so later collection runs only retrieve new statuses and
+resume back-fills that were interrupted.
+"""
+import json
+import os
+import threading
+
+""" A json file mapping each username to its checkpoint: the newest and oldest
+collected status ids and whether the back-fill reached the end of the
+timeline. Statuses with ids between oldest_id and newest_id have been stored.
+While new statuses are being caught up, new_top and new_bottom bound those
+stored so far, which lie above a gap down to newest_id. """
+class CheckpointStore(object):
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.checkpoints = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.checkpoints = json.load(f)
+
+    """ Returns the checkpoint of a username, or None if it was never collected. """
+    def get(self, username):
+        with self.lock:
+            checkpoint = self.checkpoints.get(username)
+            return dict(checkpoint) if checkpoint is not None else None
+
+    """ Extends the checkpoint of a username with a page of stored status
+    records from collector_utils.iter_pages and saves the store. Back-fill pages
+    move oldest_id down immediately. Pages of new statuses extend new_top and
+    new_bottom, and newest_id only moves up to new_top once the empty page
+    ending the phase arrives, since until then there is a gap below them. An
+    interrupted catch-up therefore resumes at the gap rather than starting
+    over. """
+    def record(self, username, phase, records):
+        with self.lock:
+            checkpoint = self.checkpoints.setdefault(username, {'newest_id': None, 'oldest_id': None, 'complete': False})
+            ids = [record.id for record in records]
+            if phase == 'new':
+                if len(ids) > 0:
+                    checkpoint['new_top'] = max(ids + [checkpoint.get('new_top') or max(ids)])
+                    checkpoint['new_bottom'] = min(ids + [checkpoint.get('new_bottom') or min(ids)])
+                elif checkpoint.get('new_top') is not None:
+                    checkpoint['newest_id'] = max(checkpoint['newest_id'], checkpoint.pop('new_top'))
+                    checkpoint.pop('new_bottom')
+            elif len(ids) > 0:
+                if checkpoint['newest_id'] is None:
+                    checkpoint['newest_id'] = max(ids)
+                checkpoint['oldest_id'] = min(ids + [checkpoint['oldest_id'] or min(ids)])
+            else:
+                checkpoint['complete'] = True
+            self.save()
+
+    """ Writes the store to its file, replacing the previous version only once
+    the new one is fully written. """
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoints, f, indent=1, sort_keys=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp_path, self.path)
@@ -2,15 +2,21 @@
 clustering.py
 
 Description: Clusters actors in interaction networks using various methods.
+
+Usage: python clustering.py [<half-life in days>]
+With a half-life, edge weights decay with the age of each interaction.
 """
 import community
 import csv
 import graph_creator as gc
 import graph_utils as util
+from graph_cache import GraphCache
 import networkx as nx
 import numpy as np
 import pandas as pd
 import skfuzzy
+import sys
+from user_categories import UserCategories
 from sklearn import cluster
 
 """ Returns a dataframe of cluster assignments using spectral clustering on a
@@ -117,49 +123,29 @@ def community_detection(g):
         df[k] = df[k].astype(v)
     return df
 
-""" Given a dataframe of cluster assignments and lists of users in each category
-returns a dataframe of cluster assignments with labels indicating each user's
-category. Also saves the labeled cluster assignments to a specified csv file."""
-def add_types(clusters_df, c_list, m_list, p_list, file_name):
-    sLength = len(clusters_df['User'])
-    clusters_df['Type'] = pd.Series(np.random.randn(sLength), index=clusters_df.index)
-    for i in range(sLength):
-        user = clusters_df.loc[i]['User']
-        if user in c_list:
-            clusters_df.loc[clusters_df['User'] == user, 'Type'] = 'c'
-        elif user in p_list:
-            clusters_df.loc[clusters_df['User'] == user, 'Type'] = 'p'
-        elif user in m_list:
-            clusters_df.loc[clusters_df['User'] == user, 'Type'] = 'm'
+""" Given a dataframe of cluster assignments and a
+user_categories.UserCategories registry, returns a dataframe of cluster
+assignments with labels indicating each user's category ('o' for users in no
+category). Also saves the labeled cluster assignments to a specified csv file.
+Before the registry, users in no category were left with a random float each,
+so every one of them formed its own class in the homogeneity, completeness and
+v-measure scores of graph_creator; they now share the class 'o', and those
+scores are not comparable with runs made before the change. """
+def add_types(clusters_df, categories, file_name):
+    clusters_df['Type'] = categories.types(clusters_df['User'].values)
     clusters_df.to_csv('Clustering\\Clusters\\{}.csv'.format(file_name))
     return clusters_df
 
-""" Given a dataframe of cluster assignments and information about each user,
-returns a dataframe of cluster assignments with information about each user.
-Also saves the labeled dataframe to a specified csv file. """
-def add_labels(clusters_df, c_df, m_df, p_df, file_name):
-    c_list = [item.lower() for item in c_df.User.values.tolist()]
-    m_list = [item.lower() for item in m_df.User.values.tolist()]
-    p_list = [item.lower() for item in p_df.User.values.tolist()]
-    sLength = len(clusters_df['User'])
-    clusters_df['Affiliation'] = pd.Series("", index=clusters_df.index)
-    clusters_df['Description'] = pd.Series("", index=clusters_df.index)
-    clusters_df['Followers'] = pd.Series(np.random.randn(sLength), index=clusters_df.index)
-    for i in range(sLength):
-        user = clusters_df.loc[i]['User']
-        if user in c_list:
-            index = c_df[c_df.User == user].index[0]
-            clusters_df.loc[clusters_df['User'] == user, 'Followers'] = c_df.get_value(index, 'Followers') # c_df.loc[c_df['User'] == user, 'Followers']
-            clusters_df.loc[clusters_df['User'] == user, 'Description'] = c_df.get_value(index, 'Description') # p_df.loc[p_df['User'] == user, 'Affiliation']
-        elif user in p_list:
-            index = p_df[p_df.User == user].index[0]
-            clusters_df.loc[clusters_df['User'] == user, 'Followers'] = p_df.get_value(index, 'Followers') # p_df.loc[p_df['User'] == user, 'Followers']
-            clusters_df.loc[clusters_df['User'] == user, 'Affiliation'] = p_df.get_value(index, 'Affiliation') # p_df.loc[p_df['User'] == user, 'Affiliation']
-            clusters_df.loc[clusters_df['User'] == user, 'Description'] = p_df.get_value(index, 'Description') # p_df.loc[p_df['User'] == user, 'Affiliation']
-        elif user in m_list:
-            index = m_df[m_df.User == user].index[0]
-            clusters_df.loc[clusters_df['User'] == user, 'Followers'] = m_df.get_value(index, 'Followers') # m_df.loc[m_df['User'] == user, 'Followers']
-            clusters_df.loc[clusters_df['User'] == user, 'Description'] = m_df.get_value(index, 'Description') # p_df.loc[p_df['User'] == user, 'Affiliation']
+""" Given a dataframe of cluster assignments and a
+user_categories.UserCategories registry, returns a dataframe of cluster
+assignments with information about each user (parsed follower counts, and
+affiliations and descriptions from the labeled list files). Also saves the
+labeled dataframe to a specified csv file. """
+def add_labels(clusters_df, categories, file_name):
+    info = categories.user_info(clusters_df['User'].values)
+    clusters_df['Affiliation'] = info['Affiliation'].fillna("").values
+    clusters_df['Description'] = info['Description'].fillna("").values
+    clusters_df['Followers'] = info['Followers'].values
     clusters_df.to_csv('Clustering\\Clusters\\{}_labeled.csv'.format(file_name))
     return clusters_df
 
@@ -174,15 +160,15 @@ def main():
     f.close()
     f2.close()
 
+    cache = GraphCache()
+    categories = UserCategories.load()
+    half_life = pd.Timedelta(days=float(sys.argv[1])) if len(sys.argv) > 1 else None
     for interaction_type in interaction_types:
-        edge_list = util.get_edge_list(interaction_type)
         c_list, m_list, p_list = util.get_lists()
-        c_df, m_df, p_df = util.get_list_dfs()
         node_lists = [c_list, m_list, p_list]
         node_labels = ["celebrities", "media", "politicians", "others"]
         cmp_list = util.append_arrays(c_list, m_list, p_list)
-        g = gc.create_graph_edge_weights(edge_list)
-        cmp_g = gc.create_graph_subset(g, cmp_list)
+        cmp_g = cache.get_networkx_graph(interaction_type, cmp_list, half_life)
 
         # Spectral Clustering
         clusters_nums = [2, 3, 4]
@@ -211,8 +197,8 @@ def main():
                 print(name,'\n')
                 print(am,'\n')
                 df = spectral_clustering(nodes, am, clusters_num)
-                labeled_df = add_types(df, c_list, m_list, p_list, "{}_{}clusters_{}".format(interaction_type, clusters_num, name))
-                labeled_df = add_labels(df, c_df, m_df, p_df, "{}_{}clusters_{}_labels".format(interaction_type, clusters_num, name))
+                labeled_df = add_types(df, categories, "{}_{}clusters_{}".format(interaction_type, clusters_num, name))
+                labeled_df = add_labels(df, categories, "{}_{}clusters_{}_labels".format(interaction_type, clusters_num, name))
                 part_labels = df['Partition']
                 k = len(part_labels.unique())
                 clusters_matrix = labeled_df
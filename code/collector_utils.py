@@ -0,0 +1,131 @@
+"""
+collector_utils.py
+
+Description: Timeline retrieval shared by the data collectors, including a
+scheduler that keeps any number of concurrent workers inside the Twitter rate
+limit. Timelines are streamed one page at a time as compact status records.
+"""
+import collections
+import threading
+import time
+import tweepy
+
+PAGE_SIZE = 200 # Maximum number of statuses returned by one user_timeline call
+RATE_LIMIT_CALLS = 900 # user_timeline calls allowed per window (user auth)
+RATE_LIMIT_WINDOW = 60 * 15 # Length of a rate limit window in seconds
+
+""" Owns the user_timeline budget for every worker sharing a set of
+credentials. Each API call first acquires a slot, which blocks until the call
+fits in the current window or a pause after a rate limit error has passed.
+A call is held against the budget for margin seconds beyond the window, since
+the server sees it slightly later than it was granted. """
+class RateLimitScheduler(object):
+    def __init__(self, calls_per_window=RATE_LIMIT_CALLS, window=RATE_LIMIT_WINDOW, margin=5):
+        self.calls_per_window = calls_per_window
+        self.window = window
+        self.margin = margin
+        self.condition = threading.Condition()
+        self.granted = collections.deque() # times of the calls in the current window
+        self.paused_until = 0
+        self.num_calls = 0
+        self.num_pauses = 0
+
+    """ Blocks until another call can be made without exceeding the limit. """
+    def acquire(self):
+        with self.condition:
+            while True:
+                now = time.time()
+                while len(self.granted) > 0 and self.granted[0] <= now - self.window - self.margin:
+                    self.granted.popleft()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif len(self.granted) >= self.calls_per_window:
+                    wait = self.granted[0] + self.window + self.margin - now
+                else:
+                    self.granted.append(now)
+                    self.num_calls += 1
+                    return
+                self.condition.wait(wait)
+
+    """ Holds back every worker for a number of seconds (by default a full
+    window). Used when the API reports the limit was hit anyway, e.g. because
+    another process shares the credentials. """
+    def pause(self, seconds=None):
+        if seconds is None:
+            seconds = self.window
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.time() + seconds)
+            self.num_pauses += 1
+            self.condition.notify_all()
+
+""" Retrieves one page of statuses for a username, retrying until the call
+succeeds. Returns an empty list once there are no more results. """
+def get_page(tweepy_api, username, scheduler=None, **kwargs):
+    while True:
+        try:
+            if scheduler is not None:
+                scheduler.acquire()
+            return tweepy_api.user_timeline(screen_name=username, count=PAGE_SIZE, include_rts=True, **kwargs)
+        except KeyError as e: # No more results for this user
+            return []
+        except tweepy.RateLimitError as e: # Hit rate limit, so wait for the window to reset
+            print('Error {}.'.format(e))
+            print('Rate limit error for account {}. Current time: {}'.format(username, time.localtime()))
+            if scheduler is not None:
+                scheduler.pause()
+            else:
+                print('Sleeping for 15 minutes.')
+                time.sleep(RATE_LIMIT_WINDOW)
+        except Exception as e: # If other exceptions (ex. internet connection interrupted), try again
+            print('Exception {} for account {}'.format(e, username))
+
+""" The parts of a tweepy Status that the collectors store. hashtags and
+user_mentions are the status's entity lists, text is utf-8 encoded, and
+reply_to and retweet_of are screen names or None. """
+StatusRecord = collections.namedtuple('StatusRecord', ['id', 'name', 'time_created', 'text', 'favorite_count', 'hashtags', 'user_mentions', 'reply_to', 'retweet_of'])
+
+""" Returns the compact record of a status. """
+def status_record(status):
+    retweet_of = None
+    if hasattr(status, 'retweeted_status'):
+        retweet_of = status.retweeted_status.user.screen_name
+    return StatusRecord(status.id, status.user.screen_name, status.created_at, status.text.encode('utf-8'),
+                        status.favorite_count, status.entities['hashtags'], status.entities['user_mentions'],
+                        status.in_reply_to_screen_name, retweet_of)
+
+""" Yields pages of statuses for a username newest first, paging back through
+the timeline with max_id, and finally the empty page that marks the end of the
+timeline. Starts below max_id and stops at since_id if given. """
+def iter_timeline(tweepy_api, username, scheduler=None, since_id=None, max_id=None):
+    bounds = {}
+    if since_id is not None:
+        bounds['since_id'] = since_id
+    if max_id is not None:
+        bounds['max_id'] = max_id
+    while True:
+        new_tweets = get_page(tweepy_api, username, scheduler, **bounds)
+        yield new_tweets
+        if len(new_tweets) == 0:
+            return
+        bounds['max_id'] = (new_tweets[-1].id) - 1 # id of last retrieved tweet
+
+""" Yields (phase, records) for each page of a username's timeline, where
+records are the page's StatusRecords. Given the account's checkpoint, phase
+'new' covers statuses newer than the checkpoint and phase 'backfill' resumes an
+interrupted back-fill below it; without one the whole timeline is a back-fill.
+If a catch-up of new statuses was interrupted, a first 'new' phase fills the gap
+below the statuses it stored before the rest are retrieved. Each phase ends
+with an empty page. """
+def iter_pages(tweepy_api, username, scheduler=None, checkpoint=None):
+    if checkpoint is None or checkpoint['newest_id'] is None:
+        phases = [('backfill', {})]
+    else:
+        phases = []
+        if checkpoint.get('new_bottom') is not None:
+            phases.append(('new', {'since_id': checkpoint['newest_id'], 'max_id': checkpoint['new_bottom'] - 1}))
+        phases.append(('new', {'since_id': checkpoint.get('new_top') or checkpoint['newest_id']}))
+        if not checkpoint['complete']:
+            phases.append(('backfill', {'max_id': checkpoint['oldest_id'] - 1}))
+    for phase, bounds in phases:
+        for page in iter_timeline(tweepy_api, username, scheduler, **bounds):
+            yield phase, [status_record(status) for status in page]
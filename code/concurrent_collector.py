@@ -0,0 +1,87 @@
+"""
+concurrent_collector.py
+
+Description: Retrieves the timelines of many accounts at once on a pool of
+threads. All threads share one RateLimitScheduler, so together they stay inside
+the rate limit while their network round-trips overlap.
+"""
+import collector_utils as cutil
+import Queue
+import threading
+import time
+
+NUM_WORKERS = 8
+QUEUE_PAGES = 2 # Pages per worker that may wait to be handled
+
+""" Retrieves the statuses of every account in account_names using num_workers
+threads. Each page of status records is passed to handle_page(username,
+records) on the calling thread as soon as it arrives, so a single database
+connection or set of csv writers can be used and at most a few pages per worker
+are held in memory. handle_done(username, num_statuses) is called once an
+account is finished. With a CheckpointStore, only statuses that were not
+collected before are retrieved, and checkpoints advance as pages are handled.
+If handling a page fails, the workers are stopped after their current call and
+joined before the error is raised. Returns the number of accounts collected per
+hour. """
+def collect_accounts(account_names, tweepy_api, handle_page, num_workers=NUM_WORKERS, scheduler=None, checkpoints=None, handle_done=None):
+    if scheduler is None:
+        scheduler = cutil.RateLimitScheduler()
+    usernames = Queue.Queue()
+    for username in account_names:
+        usernames.put(username)
+    for i in range(num_workers):
+        usernames.put(None) # tells a worker to stop
+    pages = Queue.Queue(maxsize=QUEUE_PAGES * num_workers)
+    stop = threading.Event()
+
+    def work():
+        while True:
+            username = usernames.get()
+            if username is None or stop.is_set():
+                return
+            try:
+                checkpoint = checkpoints.get(username) if checkpoints is not None else None
+                for phase, records in cutil.iter_pages(tweepy_api, username, scheduler, checkpoint):
+                    if stop.is_set():
+                        return
+                    pages.put((username, phase, records))
+                pages.put((username, None, None))
+            except Exception as e:
+                pages.put((username, 'error', e))
+
+    start = time.time()
+    workers = [threading.Thread(target=work) for i in range(num_workers)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    num_accounts = 0
+    num_statuses = {}
+    try:
+        while num_accounts < len(account_names):
+            username, phase, records = pages.get()
+            if phase == 'error':
+                raise records
+            if phase is None: # account finished
+                num_accounts += 1
+                if handle_done is not None:
+                    handle_done(username, num_statuses.pop(username, 0))
+                continue
+            if len(records) > 0:
+                handle_page(username, records)
+                num_statuses[username] = num_statuses.get(username, 0) + len(records)
+            if checkpoints is not None:
+                checkpoints.record(username, phase, records)
+    finally:
+        stop.set()
+        for worker in workers:
+            usernames.put(None)
+        while any(worker.is_alive() for worker in workers): # unblock workers waiting on a full queue
+            try:
+                pages.get(timeout=0.1)
+            except Queue.Empty:
+                pass
+        for worker in workers:
+            worker.join()
+    elapsed = time.time() - start
+    return num_accounts * 3600.0 / max(elapsed, 1e-9)
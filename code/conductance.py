@@ -2,13 +2,19 @@
 conductance.py
 
 Description: Computes conductance of clusters
+
+Usage: python conductance.py [<half-life in days>]
+With a half-life, edge weights decay with the age of each interaction.
 """
 import clustering
 import graph_creator as gc
 import graph_utils as util
+from graph_cache import GraphCache
 import networkx as nx
 import networkx_cuts as nxcuts
 import numpy as np
+import pandas as pd
+import sys
 
 """ Return conductance of a specified cluster in a given clustering of a
 network. """
@@ -18,26 +24,25 @@ def conductance_score(g, cluster_df, partition, weight=None):
     conductance_score = nxcuts.conductance(g, cluster_nodes, weight=weight)
     return conductance_score
 
-def test_conductance():
-    edge_list = util.get_edge_list('replies')
+def test_conductance(half_life=None):
     c_list, m_list, p_list = util.get_lists()
     c_df, m_df, p_df = util.get_list_dfs()
     node_lists = [c_list, m_list, p_list]
     node_labels = ["celebrities", "media", "politicians", "others"]
     cmp_list = util.append_arrays(c_list, m_list, p_list)
-    g = gc.create_graph_edge_weights(edge_list)
-    cmp_g = gc.create_graph_subset(g, cmp_list)
+    cmp_g = GraphCache().get_networkx_graph('replies', cmp_list, half_life)
     nodes = np.asarray(cmp_g.nodes())
     node_lists = [c_list, m_list, p_list]
     am = clustering.am_to_vectors(nodes, nx.adjacency_matrix(cmp_g, weight='None')) # Vectors of in and out degrees, unweighted
     clusters_df = clustering.spectral_clustering(nodes, am, 3)
 
     for i in range(3):
-        conductance = conductance_score(cmp_g, clusters_df, str(i))
+        conductance = conductance_score(cmp_g, clusters_df, str(i), weight='weight' if half_life is not None else None)
         print(conductance)
 
 def main():
-    test_conductance()
+    half_life = pd.Timedelta(days=float(sys.argv[1])) if len(sys.argv) > 1 else None
+    test_conductance(half_life)
 
 if __name__ == "__main__":
     main()
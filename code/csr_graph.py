@@ -0,0 +1,259 @@
+"""
+csr_graph.py
+
+Description: A compact directed, weighted interaction graph. Usernames are
+interned to integer ids and edges are kept in scipy sparse CSR arrays for both
+directions, instead of the nested dictionaries of a networkx DiGraph.
+"""
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+""" A directed graph with weighted edges, stored as an out-adjacency matrix in
+CSR form (row i holds the edges leaving node i) and an in-adjacency matrix in
+CSR form (row i holds the edges entering node i). names[i] is the username of
+node i and index maps usernames back to ids. """
+class CSRGraph(object):
+    def __init__(self, names, start_ids, end_ids, weights):
+        self.names = list(names)
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        num_nodes = len(self.names)
+        # Duplicate (start, end) pairs are summed into one edge
+        self.out_adj = sparse.csr_matrix((np.asarray(weights), (np.asarray(start_ids, dtype=np.int32), np.asarray(end_ids, dtype=np.int32))), shape=(num_nodes, num_nodes))
+        self.out_adj.sum_duplicates()
+        self.in_adj = self.out_adj.transpose().tocsr()
+
+    """ Returns a graph from an edge list (see graph_utils.get_edge_list) with
+    edges weighted by the number of interactions between two nodes and without
+    self-referencing edges, the same graph as
+    graph_creator.create_graph_edge_weights. Nodes are numbered in order of
+    their first appearance. If the edge list has a weight column (see
+    graph_utils.get_weighted_edge_list), each row counts as that many
+    interactions. """
+    @classmethod
+    def from_edge_list(cls, edge_list):
+        start_nodes = edge_list['start_node'].values
+        end_nodes = edge_list['end_node'].values
+        # Don't include self-referencing edges
+        keep = start_nodes != end_nodes
+        weights = edge_list['weight'].values[keep].astype(np.int64) if 'weight' in edge_list else np.ones(keep.sum(), dtype=np.int64)
+        start_nodes = start_nodes[keep]
+        end_nodes = end_nodes[keep]
+        num_edges = len(start_nodes)
+        # Interleave so nodes are numbered in the order they first appear
+        endpoints = np.empty(2 * num_edges, dtype=object)
+        endpoints[0::2] = start_nodes
+        endpoints[1::2] = end_nodes
+        codes, names = pd.factorize(endpoints)
+        return cls(names, codes[0::2], codes[1::2], weights)
+
+    """ Returns a graph over the given usernames with an existing sparse
+    out-adjacency matrix. The names, index and a CSR out-adjacency matrix are
+    shared rather than copied, but the in-adjacency matrix is built as a new
+    transposed copy. Used for the layers of a multiplex_graph.MultiplexGraph,
+    which share one list of names and index. """
+    @classmethod
+    def from_matrix(cls, names, out_adj, index=None):
+        g = cls.__new__(cls)
+        g.names = names
+        g.index = index if index is not None else dict((name, i) for i, name in enumerate(names))
+        g.out_adj = out_adj.tocsr()
+        g.in_adj = g.out_adj.transpose().tocsr()
+        return g
+
+    """ Returns a graph from arrays of start and end node ids into a list of
+    names (see graph_utils.get_edge_ids), weighted and without self-referencing
+    edges like from_edge_list. Only names with edges become nodes. """
+    @classmethod
+    def from_edge_ids(cls, names, start_ids, end_ids):
+        # Don't include self-referencing edges
+        keep = start_ids != end_ids
+        num_names = len(names)
+        out_adj = sparse.csr_matrix((np.ones(keep.sum(), dtype=np.int64), (start_ids[keep], end_ids[keep])), shape=(num_names, num_names))
+        out_adj.sum_duplicates()
+        return cls.from_matrix(names, out_adj).compact()
+
+    """ Returns a graph with the nodes and edges of a networkx graph. """
+    @classmethod
+    def from_networkx(cls, G, weight='weight'):
+        names = G.nodes()
+        index = dict((name, i) for i, name in enumerate(names))
+        edges = G.edges(data=True)
+        start_ids = [index[u] for u, v, d in edges]
+        end_ids = [index[v] for u, v, d in edges]
+        weights = [d.get(weight, 1) for u, v, d in edges]
+        return cls(names, start_ids, end_ids, weights)
+
+    """ Returns a networkx DiGraph with the same nodes and weighted edges. """
+    def to_networkx(self, weight='weight'):
+        G = nx.DiGraph()
+        G.add_nodes_from(self.names)
+        coo = self.out_adj.tocoo()
+        names = np.array(self.names, dtype=object)
+        G.add_weighted_edges_from(zip(names[coo.row].tolist(), names[coo.col].tolist(), coo.data.tolist()), weight=weight)
+        return G
+
+    def number_of_nodes(self):
+        return len(self.names)
+
+    def number_of_edges(self):
+        return self.out_adj.nnz
+
+    """ Returns the number of bytes used by the adjacency arrays. """
+    def nbytes(self):
+        total = 0
+        for adj in [self.out_adj, self.in_adj]:
+            total += adj.data.nbytes + adj.indices.nbytes + adj.indptr.nbytes
+        return total
+
+    """ Returns an array of node ids for the usernames in names that are in the
+    graph. """
+    def ids(self, names):
+        return np.array([self.index[name] for name in names if name in self.index], dtype=np.int32)
+
+    """ Returns a boolean array marking the nodes whose usernames are in names. """
+    def node_mask(self, names):
+        mask = np.zeros(len(self.names), dtype=bool)
+        mask[self.ids(names)] = True
+        return mask
+
+    """ Returns an array with the out-degree of every node, summing edge weights
+    if weighted is True. """
+    def out_degree(self, weighted=True):
+        if weighted:
+            return np.asarray(self.out_adj.sum(axis=1)).ravel()
+        return np.diff(self.out_adj.indptr)
+
+    """ Returns an array with the in-degree of every node, summing edge weights
+    if weighted is True. """
+    def in_degree(self, weighted=True):
+        if weighted:
+            return np.asarray(self.in_adj.sum(axis=1)).ravel()
+        return np.diff(self.in_adj.indptr)
+
+    """ Returns a dictionary mapping each username to its value in an array
+    indexed by node id. """
+    def to_dict(self, values):
+        return dict(zip(self.names, np.asarray(values).tolist()))
+
+    """ Returns the usernames of the nodes an edge from a username goes to. """
+    def successors(self, name):
+        i = self.index[name]
+        return [self.names[j] for j in self.out_adj.indices[self.out_adj.indptr[i]:self.out_adj.indptr[i + 1]]]
+
+    """ Returns the usernames of the nodes with an edge to a username. """
+    def predecessors(self, name):
+        i = self.index[name]
+        return [self.names[j] for j in self.in_adj.indices[self.in_adj.indptr[i]:self.in_adj.indptr[i + 1]]]
+
+    """ Returns a graph with the edges for which keep (a boolean array in the
+    order of out_adj's stored edges) is True, and only the nodes they touch. """
+    def edge_subgraph(self, keep):
+        coo = self.out_adj.tocoo()
+        start_ids = coo.row[keep]
+        end_ids = coo.col[keep]
+        used = np.zeros(len(self.names), dtype=bool)
+        used[start_ids] = True
+        used[end_ids] = True
+        new_ids = np.cumsum(used) - 1
+        names = np.array(self.names, dtype=object)[used]
+        return CSRGraph(names, new_ids[start_ids], new_ids[end_ids], coo.data[keep])
+
+    """ Returns a graph with the same edges and only the nodes that have edges,
+    numbered in the same order. """
+    def compact(self):
+        return self.edge_subgraph(np.ones(self.out_adj.nnz, dtype=bool))
+
+    """ Returns a graph with only the edges that start from a node in
+    from_nodes and end at a node in to_nodes, each either a collection of
+    usernames or a boolean mask over node ids, or None to leave that end
+    unfiltered. """
+    def filter_edges(self, from_nodes=None, to_nodes=None):
+        coo = self.out_adj.tocoo()
+        keep = np.ones(coo.nnz, dtype=bool)
+        if from_nodes is not None:
+            keep &= self.as_mask(from_nodes)[coo.row]
+        if to_nodes is not None:
+            keep &= self.as_mask(to_nodes)[coo.col]
+        return self.edge_subgraph(keep)
+
+    """ Returns nodes as a boolean mask over node ids, given either a mask or a
+    collection of usernames. """
+    def as_mask(self, nodes):
+        if isinstance(nodes, np.ndarray) and nodes.dtype == bool:
+            return nodes
+        return self.node_mask(nodes)
+
+    """ Returns a graph with only the edges starting from a list of usernames,
+    like graph_utils.get_edges_from. """
+    def edges_from(self, names):
+        return self.filter_edges(from_nodes=names)
+
+    """ Returns a graph with only the edges going to a list of usernames, like
+    graph_utils.get_edges_to. """
+    def edges_to(self, names):
+        return self.filter_edges(to_nodes=names)
+
+    """ Returns an array with the number of edges on the shortest path from a
+    username to every node, or -1 for nodes that cannot be reached. """
+    def bfs_distances(self, name):
+        distances = np.full(len(self.names), -1, dtype=np.int32)
+        frontier = np.array([self.index[name]], dtype=np.int32)
+        distance = 0
+        pattern = self.out_adj.astype(bool)
+        while len(frontier) > 0:
+            distances[frontier] = distance
+            reached = pattern[frontier].indices
+            frontier = np.unique(reached[distances[reached] == -1])
+            distance += 1
+        return distances
+
+    """ Returns a dataframe with one row per cluster, given an array with the
+    cluster of every node (or -1 for nodes in no cluster): its number of nodes,
+    the weight of edges inside it, the weight of edges crossing its boundary in
+    either direction, its volume (total weighted out-degree) and its
+    conductance, defined as in conductance.conductance_score. """
+    def cluster_stats(self, labels):
+        labels = np.asarray(labels)
+        clusters = np.unique(labels[labels >= 0])
+        num_clusters = clusters[-1] + 1 if len(clusters) > 0 else 0
+        coo = self.out_adj.tocoo()
+        start_labels = labels[coo.row]
+        end_labels = labels[coo.col]
+        weights = coo.data.astype(float)
+        inside = (start_labels == end_labels) & (start_labels >= 0)
+        internal = np.bincount(start_labels[inside], weights[inside], minlength=num_clusters)
+        crossing = ~inside
+        cut = np.bincount(start_labels[crossing & (start_labels >= 0)], weights[crossing & (start_labels >= 0)], minlength=num_clusters)
+        cut += np.bincount(end_labels[crossing & (end_labels >= 0)], weights[crossing & (end_labels >= 0)], minlength=num_clusters)
+        out_degree = self.out_degree(weighted=True).astype(float)
+        clustered = labels >= 0
+        volume = np.bincount(labels[clustered], out_degree[clustered], minlength=num_clusters)
+        sizes = np.bincount(labels[clustered], minlength=num_clusters)
+        other_volume = out_degree.sum() - volume
+        with np.errstate(divide='ignore', invalid='ignore'):
+            conductance = cut / np.minimum(volume, other_volume)
+        return pd.DataFrame({'cluster': clusters, 'num_nodes': sizes[clusters], 'internal_weight': internal[clusters],
+                             'cut_weight': cut[clusters], 'volume': volume[clusters], 'conductance': conductance[clusters]},
+                            columns=['cluster', 'num_nodes', 'internal_weight', 'cut_weight', 'volume', 'conductance'])
+
+    """ Returns an array with the PageRank of every node, computed like
+    networkx.pagerank: edges are followed in proportion to their weight and
+    nodes without out-edges link to every node. """
+    def pagerank(self, alpha=0.85, max_iter=100, tol=1.0e-6):
+        num_nodes = len(self.names)
+        if num_nodes == 0:
+            return np.zeros(0)
+        out_weight = self.out_degree(weighted=True).astype(float)
+        dangling = out_weight == 0
+        inverse = np.zeros(num_nodes)
+        inverse[~dangling] = 1.0 / out_weight[~dangling]
+        transition = sparse.diags(inverse).dot(self.out_adj).transpose().tocsr()
+        x = np.full(num_nodes, 1.0 / num_nodes)
+        for i in range(max_iter):
+            last = x
+            x = alpha * (transition.dot(last) + last[dangling].sum() / num_nodes) + (1 - alpha) / num_nodes
+            if np.abs(x - last).sum() < num_nodes * tol:
+                return x
+        raise nx.NetworkXError('pagerank: power iteration failed to converge in {} iterations.'.format(max_iter))
@@ -1,6 +1,10 @@
 """
-Includes timestamps in csv edge lists.
+Includes timestamps in csv edge lists. Each edge row also holds the id of its
+status and its position among that status's edges, so bulk_loader.py can skip
+the edges of statuses that were written twice.
 """
+from checkpoints import CheckpointStore
+import concurrent_collector as concurrent
 import csv #Import csv
 import json
 import matplotlib.pyplot as plt
@@ -23,68 +27,49 @@ def get_account_names(info_file):
     info =  np.loadtxt(info_file, dtype=str, delimiter=',', skiprows=1)
     return info[:,ACCOUNT_COL]
 
-def get_statuses(username):
-    print 'Retrieving info for {}'.format(username)
-    RATE_LIMIT_CODE = 88
-    tweepy_api = authorize()
-    statuses = []
-    count = 200;
-    first_set = True
-    while(first_set == True or len(new_tweets) > 0):
-        # print "Length of statuses", len(statuses)
-        # print "New tweets", len(new_tweets)
-        try:
-            if first_set:
-                new_tweets = tweepy_api.user_timeline(screen_name=username, count=count, include_rts=True)
-                first_set = False
-            else:
-                max_id = (statuses[-1].id) - 1 # id of last retrieved tweet
-                new_tweets = tweepy_api.user_timeline(username, count=count, include_rts=True, max_id = max_id)
-            statuses += new_tweets
-        except KeyError, e: # No more results when next_results doesn't exist
-            break
-        except tweepy.RateLimitError as e:
-            print 'Error {}.'.format(e)
-            print 'Currently at {} statuses for account {}'.format(len(statuses), username)
-            print 'Rate limit error. Sleeping for 15 minutes. Current time: {}'.format(time.localtime())
-            time.sleep(60 * 15)
-        except Exception as e:
-            print 'Exception {}'.format(e)
-            print 'Currently at {} statuses for account {}'.format(len(statuses), username)
-    return statuses
-
-def write_info(status, statusesWriter, mentionsWriter, retweetsWriter, repliesWriter, hashtagsWriter):
-    username = status.user.screen_name
+""" Writes a status record (see collector_utils.StatusRecord) and its
+interactions to the csv files. """
+def write_info(record, statusesWriter, mentionsWriter, retweetsWriter, repliesWriter, hashtagsWriter):
+    username = record.name
     #Write a row to the csv file/ I use encode utf-8
-    statusesWriter.writerow([username, status.created_at, status.text.encode('utf-8'), status.favorite_count, status.id, status.entities['hashtags'], status.entities['user_mentions'], status.in_reply_to_screen_name])
+    statusesWriter.writerow([username, record.time_created, record.text, record.favorite_count, record.id, record.hashtags, record.user_mentions, record.reply_to])
     # Write a row for each mention
-    for user_mention in status.entities['user_mentions']:
-        mentionsWriter.writerow([username, user_mention['screen_name'], status.created_at])
+    for position, user_mention in enumerate(record.user_mentions):
+        mentionsWriter.writerow([username, user_mention['screen_name'], record.time_created, record.id, position])
 
     # Write a row if it's a retweet
-    if hasattr(status, 'retweeted_status'):
-        retweetsWriter.writerow([username, status.retweeted_status.user.screen_name, status.created_at])
+    if record.retweet_of != None:
+        retweetsWriter.writerow([username, record.retweet_of, record.time_created, record.id, 0])
 
     # Write a row if it's a reply
-    if status.in_reply_to_screen_name != None:
-        repliesWriter.writerow([username, status.in_reply_to_screen_name, status.created_at])
+    if record.reply_to != None:
+        repliesWriter.writerow([username, record.reply_to, record.time_created, record.id, 0])
 
     # Write a row for each hashtags
-    for hashtag in status.entities['hashtags']:
-        hashtagsWriter.writerow([username, hashtag['text'].encode('utf-8'), status.created_at])
-
-def write_info_to_files(account_names, statusesWriter, mentionsWriter, retweetsWriter, repliesWriter, hashtagsWriter, counterWriter):
-    total_statuses = 0;
-    for username in account_names:
-        statuses = get_statuses(username)
-        print 'Retrieved {} statuses for {}'.format(len(statuses), username)
-        counterWriter.writerow([username, len(statuses)])
-        total_statuses += len(statuses)
-        print "total statuses {}".format(total_statuses)
-        for status in statuses:
-            write_info(status, statusesWriter, mentionsWriter, retweetsWriter, repliesWriter, hashtagsWriter)
-
-def write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName):
+    for position, hashtag in enumerate(record.hashtags):
+        hashtagsWriter.writerow([username, hashtag['text'].encode('utf-8'), record.time_created, record.id, position])
+
+def write_info_to_files(account_names, statusesWriter, mentionsWriter, retweetsWriter, repliesWriter, hashtagsWriter, counterWriter, num_workers=concurrent.NUM_WORKERS, checkpoints=None, files=None):
+    if files is None:
+        files = []
+    totals = {'statuses': 0}
+    def handle_page(username, records):
+        for record in records:
+            write_info(record, statusesWriter, mentionsWriter, retweetsWriter, repliesWriter, hashtagsWriter)
+        for f in files: # the page must be on disk before its checkpoint is saved
+            f.flush()
+    def handle_done(username, num_statuses):
+        print 'Retrieved {} statuses for {}'.format(num_statuses, username)
+        counterWriter.writerow([username, num_statuses])
+        totals['statuses'] += num_statuses
+        print "total statuses {}".format(totals['statuses'])
+    accounts_per_hour = concurrent.collect_accounts(account_names, authorize(), handle_page, num_workers, checkpoints=checkpoints, handle_done=handle_done)
+    print 'Collected {:.1f} accounts per hour'.format(accounts_per_hour)
+
+""" Appends the statuses and interactions of every account in accountsFileName
+to the csv files. The checkpoint file records what the files already contain,
+so repeated runs only append new statuses. """
+def write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName, checkpointsFileName):
     statusesFile = open(statusesFileName, 'a')
     mentionsFile = open(mentionsFileName, 'a')
     retweetsFile = open(retweetsFileName, 'a')
@@ -101,7 +86,8 @@ def write_all_info(statusesFileName, mentionsFileName, retweetsFileName, replies
     hashtagsWriter = csv.writer(hashtagsFile, lineterminator='\n')
     counterWriter = csv.writer(counterFile, lineterminator='\n')
 
-    write_info_to_files(account_names, statusesWriter, mentionsWriter, retweetsWriter, repliesWriter, hashtagsWriter, counterWriter)
+    checkpoints = CheckpointStore(checkpointsFileName)
+    write_info_to_files(account_names, statusesWriter, mentionsWriter, retweetsWriter, repliesWriter, hashtagsWriter, counterWriter, checkpoints=checkpoints, files=[statusesFile, mentionsFile, retweetsFile, repliesFile, hashtagsFile])
 
     statusesFile.close()
     mentionsFile.close()
@@ -120,7 +106,8 @@ def main():
     hashtagsFileName = "politicians_hashtags_timestamps.csv"
     counterFileName = "politicians_counts.csv"
     accountsFileName = "politicianslist.csv"
-    write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName)
+    checkpointsFileName = "politicians_checkpoints.json"
+    write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName, checkpointsFileName)
 
     # Senators
     statusesFileName = "senators_statuses_timestamps.csv"
@@ -130,7 +117,8 @@ def main():
     repliesFileName = "senators_replies_timestamps.csv"
     counterFileName = "senators_counts.csv"
     accountsFileName = "senatorslist.csv"
-    write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName)
+    checkpointsFileName = "senators_checkpoints.json"
+    write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName, checkpointsFileName)
 
     # Media
     statusesFileName = "media_statuses_timestamps.csv"
@@ -140,7 +128,8 @@ def main():
     hashtagsFileName = "media_hashtags_timestamps.csv"
     counterFileName = "media_counts.csv"
     accountsFileName = "medialist.csv"
-    write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName)
+    checkpointsFileName = "media_checkpoints.json"
+    write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName, checkpointsFileName)
 
     # Celebrities
     statusesFileName = "celebrities_statuses_timestamps.csv"
@@ -150,7 +139,8 @@ def main():
     hashtagsFileName = "celebrities_hashtags_timestamps.csv"
     counterFileName = "celebrities_counts.csv"
     accountsFileName = "celebritieslist.csv"
-    write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName)
+    checkpointsFileName = "celebrities_checkpoints.json"
+    write_all_info(statusesFileName, mentionsFileName, retweetsFileName, repliesFileName, hashtagsFileName, counterFileName, accountsFileName, checkpointsFileName)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,108 @@
+"""
+decayed_graph.py
+
+Description: Builds interaction graphs whose edge weights decay exponentially
+with the age of each interaction, so that recent interactions count more than
+old ones.
+"""
+import csr_graph
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+HALF_LIFE = pd.Timedelta(days=30)
+MAX_EXPONENT = 512 # Rebase once stored weights reach 2 ** MAX_EXPONENT
+
+""" A directed graph in which each interaction at time t contributes
+2 ** (-(now - t) / half_life) to the weight of its edge. Weights are stored
+relative to a reference time instead, each interaction contributing
+2 ** ((t - reference) / half_life), so that they never need updating as time
+passes: the weight as of any time is the stored weight times one global
+factor. New interactions only add their own contributions, and the stored
+weights are only rescaled (rebased) when they grow too large to represent. """
+class DecayedGraph(object):
+    def __init__(self, half_life=HALF_LIFE):
+        self.half_life = pd.Timedelta(half_life)
+        self.names = []
+        self.index = {}
+        self.reference = None # numpy datetime64 time of weight 1
+        self.latest = None # time of the newest interaction
+        self.matrix = sparse.csr_matrix((0, 0))
+        self.pending = [] # (start ids, end ids, weights) not yet in matrix
+
+    """ Returns a decayed graph of the interactions in an edge list with a
+    time_created column (see graph_utils.get_edge_list with with_times). """
+    @classmethod
+    def from_edge_list(cls, edge_list, half_life=HALF_LIFE):
+        g = cls(half_life)
+        g.add_edges(edge_list)
+        return g
+
+    """ Adds the interactions of an edge list with a time_created column,
+    without self-referencing edges, in time proportional to its length. """
+    def add_edges(self, edge_list):
+        start_nodes = edge_list['start_node'].values
+        end_nodes = edge_list['end_node'].values
+        # Don't include self-referencing edges
+        keep = start_nodes != end_nodes
+        times = pd.to_datetime(edge_list['time_created']).values[keep]
+        if len(times) == 0:
+            return
+        num_edges = len(times)
+        # Interleave so nodes are numbered in the order they first appear
+        endpoints = np.empty(2 * num_edges, dtype=object)
+        endpoints[0::2] = start_nodes[keep]
+        endpoints[1::2] = end_nodes[keep]
+        codes, names = pd.factorize(endpoints)
+        ids = np.array([self.intern(name) for name in names], dtype=np.int64)[codes]
+        if self.reference is None:
+            self.reference = times.min()
+        newest = times.max()
+        self.latest = newest if self.latest is None else max(self.latest, newest)
+        if self.exponents(np.array([newest]))[0] > MAX_EXPONENT:
+            self.rebase(newest)
+        self.pending.append((ids[0::2], ids[1::2], np.exp2(self.exponents(times))))
+
+    """ Returns the id of a username, numbering it if it is new. """
+    def intern(self, name):
+        i = self.index.get(name)
+        if i is None:
+            i = len(self.names)
+            self.index[name] = i
+            self.names.append(name)
+        return i
+
+    """ Returns (times - reference) / half_life for an array of times. """
+    def exponents(self, times):
+        return (times - self.reference) / np.timedelta64(self.half_life.value, 'ns')
+
+    """ Moves the reference time, rescaling every stored weight once. """
+    def rebase(self, reference):
+        factor = np.exp2(-self.exponents(np.array([reference]))[0])
+        self.consolidate()
+        self.matrix = self.matrix * factor
+        self.reference = reference
+
+    """ Adds the pending interactions to the weight matrix. """
+    def consolidate(self):
+        num_nodes = len(self.names)
+        old = self.matrix.tocoo()
+        start_ids = np.concatenate([old.row] + [p[0] for p in self.pending])
+        end_ids = np.concatenate([old.col] + [p[1] for p in self.pending])
+        weights = np.concatenate([old.data] + [p[2] for p in self.pending])
+        self.matrix = sparse.csr_matrix((weights, (start_ids, end_ids)), shape=(num_nodes, num_nodes))
+        self.matrix.sum_duplicates()
+        self.pending = []
+
+    """ Returns the graph with weights as of a given time (the newest
+    interaction by default) as a csr_graph.CSRGraph. Only the relative weights
+    of edges matter to PageRank, clustering and conductance, so any time gives
+    the same results there. """
+    def graph(self, now=None):
+        if len(self.pending) > 0 or self.matrix.shape[0] != len(self.names):
+            self.consolidate()
+        if self.reference is None:
+            return csr_graph.CSRGraph.from_matrix([], self.matrix)
+        now = np.datetime64(pd.Timestamp(now)) if now is not None else self.latest
+        factor = np.exp2(-self.exponents(np.array([now]))[0])
+        return csr_graph.CSRGraph.from_matrix(list(self.names), self.matrix * factor)
@@ -1,25 +1,143 @@
 """
 Extracts edges information from a csv file of statuses collected using
 data_collector.py
+
+Usage: python edges_from_statuses.py <statuses file> [<output prefix> [<chunk size> [<workers>]]]
+With an output prefix, the file is read in chunks and the edges are written to
+<output prefix>_<interaction type>_edges.csv as they are extracted. With more
+than one worker, shards of the file are extracted in parallel processes.
 """
+import csv
+import io
+import multiprocessing
 import numpy as np
 import pandas as pd
 import string as st
 import sys
 
+INTERACTION_TYPES = ['hashtags', 'mentions', 'retweets', 'replies']
+CHUNK_SIZE = 50000 # Statuses per chunk when reading large files
+SHARD_BYTES = 16 * 1024 * 1024 # Approximate size of a shard for parallel extraction
+HASHTAG_POSITIONS = (5, 0) # apostrophes before and after each hashtag's text
+MENTION_POSITIONS = (11, 4) # apostrophes before and after each mention's screen_name
+
 def statuses_from_file(statuses_file):
     df = pd.read_csv(statuses_file, sep=',', header=None)
     df = df.fillna("None")
     return df.values
 
+""" Yields numpy arrays of at most chunksize statuses from a statuses file,
+reading only the columns used for edge extraction. Columns keep their
+positions; the ones that are not read are left empty. """
+def status_chunks_from_file(statuses_file, chunksize=CHUNK_SIZE):
+    reader = pd.read_csv(statuses_file, sep=',', header=None, usecols=edge_cols(), dtype=str, chunksize=chunksize)
+    for df in reader:
+        yield statuses_from_frame(df)
+
+""" The columns of the statuses file used for edge extraction. """
+def edge_cols():
+    return [username_col, time_col, content_col, hashtag_col, mentions_col, replies_col]
+
+""" Returns a numpy array of statuses from a dataframe read with only the
+edge_cols() columns, with those columns at their usual positions. """
+def statuses_from_frame(df):
+    df = df.fillna("None")
+    statuses = np.empty((len(df.index), max(edge_cols()) + 1), dtype=object)
+    statuses[:, df.columns.values] = df.values
+    return statuses
+
+""" Returns a list of (start, end) byte ranges that split a statuses file into
+shards of about shard_bytes each. Shards end at line breaks outside quoted
+fields, found by keeping count of the quotes seen so far, so a status whose
+text contains line breaks is never split. """
+def shard_offsets(statuses_file, shard_bytes=SHARD_BYTES):
+    offsets = [0]
+    num_quotes = 0
+    position = 0 # file offset of the start of block
+    target = shard_bytes
+    with open(statuses_file, 'rb') as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if len(block) == 0:
+                break
+            index = 0 # quotes before index are counted
+            while position + len(block) > target:
+                newline = block.find('\n', max(index, target - position))
+                if newline == -1:
+                    break
+                num_quotes += block.count('"', index, newline)
+                index = newline
+                if num_quotes % 2 == 0:
+                    offsets.append(position + newline + 1)
+                    target = position + newline + 1 + shard_bytes
+                else:
+                    target = position + newline + 1
+            num_quotes += block.count('"', index)
+            position += len(block)
+    if offsets[-1] < position:
+        offsets.append(position)
+    return zip(offsets[:-1], offsets[1:])
+
+""" Returns the interaction edges of the statuses between two byte offsets of
+a statuses file. Runs in a worker process. """
+def edges_from_shard(args):
+    statuses_file, start, end = args
+    set_colnames()
+    with open(statuses_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    df = pd.read_csv(io.BytesIO(data), sep=',', header=None, usecols=edge_cols(), dtype=str)
+    return interactions_from_statuses(statuses_from_frame(df))
+
+""" Extracts the edges of every interaction type from a statuses file with
+num_workers processes, each extracting one shard of the file at a time. Shards
+are written to <out_prefix>_<interaction type>_edges.csv in file order, so the
+output is the same as edges_to_files. Returns the number of edges written for
+each interaction type. """
+def edges_to_files_parallel(statuses_file, out_prefix, num_workers, shard_bytes=SHARD_BYTES):
+    shards = [(statuses_file, start, end) for start, end in shard_offsets(statuses_file, shard_bytes)]
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        return write_edges(pool.imap(edges_from_shard, shards), out_prefix)
+    finally:
+        pool.close()
+        pool.join()
+
+""" Extracts the edges of every interaction type from a statuses file one chunk
+at a time, appending them to <out_prefix>_<interaction type>_edges.csv as each
+chunk is processed, so memory use depends on the chunk size rather than the
+file size. Returns the number of edges written for each interaction type. """
+def edges_to_files(statuses_file, out_prefix, chunksize=CHUNK_SIZE):
+    chunks = status_chunks_from_file(statuses_file, chunksize)
+    return write_edges((interactions_from_statuses(statuses) for statuses in chunks), out_prefix)
+
+""" Writes each dictionary of interaction edges from an iterator to
+<out_prefix>_<interaction type>_edges.csv as it arrives. Returns the number of
+edges written for each interaction type. """
+def write_edges(interactions_iter, out_prefix):
+    files = {}
+    writers = {}
+    counts = {}
+    for interaction_type in INTERACTION_TYPES:
+        files[interaction_type] = open('{}_{}_edges.csv'.format(out_prefix, interaction_type), 'wb')
+        writers[interaction_type] = csv.writer(files[interaction_type], lineterminator='\n')
+        counts[interaction_type] = 0
+    try:
+        for interactions in interactions_iter:
+            for interaction_type in INTERACTION_TYPES:
+                writers[interaction_type].writerows(interactions[interaction_type])
+                counts[interaction_type] += len(interactions[interaction_type])
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
+
 def hashtags_from_statuses(statuses):
-    before = 5
-    after = 0
+    before, after = HASHTAG_POSITIONS
     return edges_from_statuses(statuses, hashtag_col, before, after)
 
 def mentions_from_statuses(statuses):
-    before = 11
-    after = 4
+    before, after = MENTION_POSITIONS
     return edges_from_statuses(statuses, mentions_col, before, after)
 
 def replies_from_statuses(statuses):
@@ -27,83 +145,111 @@ def replies_from_statuses(statuses):
     mask = replies_data[:,1] != "None"
     return replies_data[mask]
 
+""" Returns a numpy array of retweets (each row of the form [username,
+retweeted username]) from a numpy array of statuses, using the "RT @name:"
+prefix of each status's text. """
 def retweets_from_statuses(statuses):
-    initialized = False
+    usernames = []
+    retweet_names = []
+    for username, content in zip(statuses[:, username_col], statuses[:, content_col]):
+        name = retweet_name(content)
+        if name is not None:
+            usernames.append(username)
+            retweet_names.append(name)
+    return edge_array(usernames, retweet_names)
+
+""" Returns the retweeted username in a status's text, or None if the status is
+not a retweet. """
+def retweet_name(content):
     signal_rt = "RT @"
     signal_end = ":"
-    for i in range(statuses.shape[0]):
-        username = statuses[i, username_col]
-        content = statuses[i, content_col]
-        if st.find(content, signal_rt) > -1:
-            start = st.find(content, signal_rt)
-            end = st.find(content, signal_end)
-            retweet_name = content[start + 4:end]
-            retweet = np.reshape(np.array([username, retweet_name]), (1, 2))
-            if not initialized:
-                initialized = True
-                retweets = retweet
-            else:
-                retweets = np.concatenate((retweets, retweet), axis=0)
-    return retweets
+    start = st.find(content, signal_rt)
+    if start == -1:
+        return None
+    end = st.find(content, signal_end)
+    return content[start + 4:end]
+
+""" Returns a dictionary with a numpy array of edges for each interaction type
+(hashtags, mentions, retweets and replies), each row of the form [username,
+value, time_created], from a numpy array of statuses. All four are extracted
+in a single pass that reads each row once. """
+def interactions_from_statuses(statuses):
+    hashtag_before, hashtag_after = HASHTAG_POSITIONS
+    mention_before, mention_after = MENTION_POSITIONS
+    hashtags = ([], [], [])
+    mentions = ([], [], [])
+    retweets = ([], [], [])
+    replies = ([], [], [])
+    rows = zip(statuses[:, username_col], statuses[:, time_col], statuses[:, content_col],
+               statuses[:, hashtag_col], statuses[:, mentions_col], statuses[:, replies_col])
+    for username, time_created, content, hashtag_string, mentions_string, reply in rows:
+        values = info_from_string(hashtag_string, hashtag_before, hashtag_after)
+        if len(values) > 0:
+            add_edges(hashtags, username, values, time_created)
+        values = info_from_string(mentions_string, mention_before, mention_after)
+        if len(values) > 0:
+            add_edges(mentions, username, values, time_created)
+        name = retweet_name(content)
+        if name is not None:
+            add_edges(retweets, username, [name], time_created)
+        if reply != "None":
+            add_edges(replies, username, [reply], time_created)
+    return {'hashtags': edge_array(*hashtags), 'mentions': edge_array(*mentions),
+            'retweets': edge_array(*retweets), 'replies': edge_array(*replies)}
+
+""" Appends an edge from username to each value, created at time_created, to a
+tuple of column lists. """
+def add_edges(columns, username, values, time_created):
+    start_nodes, end_nodes, times = columns
+    start_nodes += [username] * len(values)
+    end_nodes += values
+    times += [time_created] * len(values)
 
 """ Returns a numpy array of hashtags (each row of the form [username, hashtag])
-from a numpy array of statuses collected using data_collector.py. """
+from a numpy array of statuses collected using data_collector.py. Values are
+accumulated in lists and converted to an array once, so the cost is linear in
+the number of edges. """
 def edges_from_statuses(statuses, col, before, after):
-    initialized = False
-    for i in range(statuses.shape[0]):
-        username = statuses[i, username_col]
-        status_edges = edges_from_status(username, statuses[i,col], before, after)
-        if status_edges is not None:
-            if initialized == False:
-                initialized = True
-                edges = status_edges
-            else:
-                edges = np.concatenate((edges, status_edges), axis=0)
-    return edges
+    usernames = []
+    values = []
+    for username, string in zip(statuses[:, username_col], statuses[:, col]):
+        status_values = info_from_string(string, before, after)
+        usernames += [username] * len(status_values)
+        values += status_values
+    return edge_array(usernames, values)
 
 """ Returns a numpy array of hashtags (each row of the form [username, hashtag])
 from a hashtag entity list represented as a string. """
 def edges_from_status(username, string, before, after):
-    edges = info_from_string(string, before, after)
-    if edges is None:
-        return edges
-    num_edges = edges.size
-    username_array = np.reshape(np.repeat(np.array([username]), num_edges, axis=0), (num_edges, 1))
-    return np.concatenate((username_array, edges), axis=1)
+    values = info_from_string(string, before, after)
+    if len(values) == 0:
+        return None
+    return edge_array([username] * len(values), values)
+
+""" Returns an array of edges with a column for each given list: start nodes,
+end nodes and optionally the times the edges were created. """
+def edge_array(start_nodes, end_nodes, times=None):
+    columns = [start_nodes, end_nodes] if times is None else [start_nodes, end_nodes, times]
+    if len(start_nodes) == 0:
+        return np.empty((0, len(columns)), dtype=str)
+    return np.column_stack([np.array(column) for column in columns])
 
 """ Retrieves words from a string based on apostrophe positions. Retrieves the
 word following the num_before'th apostrophe, and starts a new cycle after skipping
-num_after more apostrophes."""
+num_after more apostrophes. Returns a list of the words, found with a single
+split of the string. """
 def info_from_string(string, num_before, num_after):
-    values = None
-    index = 0
     signal = "'"
-    while True:
-        index = skip_n_signals(string, signal, index, num_before)
-        if index == -1:
-            return values
-        end_index = st.find(string, signal, index + 1)
-        value = np.reshape(np.array([string[index + 1:end_index]]), (1, 1))
-        if values is None:
-            values = value
-        else:
-            values = np.concatenate((values, value), axis=0)
-        index = end_index
-        index = skip_n_signals(string, signal, index, num_after)
-        if index == -1:
-            return values
-
-def skip_n_signals(string, signal, index, n):
-    for i in range(n):
-        last_index = index + 1
-        index = st.find(string, signal, last_index)
-        if index == -1:
-            return index
-    return index
+    if string.startswith(signal): # the search for apostrophes starts at the second character
+        string = string[1:]
+    parts = string.split(signal)
+    period = num_before + num_after + 1
+    last = len(parts) - 1 # parts after the last apostrophe are not closed
+    return [parts[i] for i in range(num_before, last, period)]
 
 """ The columnnames of statuses stored using data_collector.py. """
 def set_colnames():
-    global username_col, time_col, content_col, hashtag_col, retweets_col, replies_col
+    global username_col, time_col, content_col, hashtag_col, mentions_col, replies_col
     username_col = 0
     time_col = 1
     content_col = 2
@@ -114,11 +260,21 @@ def set_colnames():
 def main():
     statuses_file = sys.argv[1]
     set_colnames()
+    if len(sys.argv) > 2:
+        chunksize = int(sys.argv[3]) if len(sys.argv) > 3 else CHUNK_SIZE
+        num_workers = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+        if num_workers > 1:
+            counts = edges_to_files_parallel(statuses_file, sys.argv[2], num_workers)
+        else:
+            counts = edges_to_files(statuses_file, sys.argv[2], chunksize)
+        for interaction_type in INTERACTION_TYPES:
+            print '{}: {} edges'.format(interaction_type, counts[interaction_type])
+        return
     statuses = statuses_from_file(statuses_file)
     print statuses.shape
-    print hashtags_from_statuses(statuses)
-    retweets = retweets_from_statuses(statuses)
-    print retweets
-    print replies_from_statuses(statuses)
+    interactions = interactions_from_statuses(statuses)
+    for interaction_type in INTERACTION_TYPES:
+        print interaction_type
+        print interactions[interaction_type]
 if __name__ == "__main__":
     main()
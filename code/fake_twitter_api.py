@@ -0,0 +1,110 @@
+"""
+fake_twitter_api.py
+
+Description: A local stand-in for tweepy.API that serves generated timelines,
+so the collectors can be exercised and benchmarked without credentials or
+network access. Simulates per-call latency and enforces its own rate limit.
+"""
+import collections
+import datetime
+import random
+import threading
+import time
+import tweepy
+
+""" Minimal stand-in for a tweepy Status object. """
+class FakeStatus(object):
+    def __init__(self, status_id, username, created_at, text, mentions, hashtags, reply_to, retweet_of):
+        self.id = status_id
+        self.user = FakeUser(username)
+        self.created_at = created_at
+        self.text = text
+        self.favorite_count = status_id % 100
+        self.entities = {'user_mentions': [{'screen_name': name} for name in mentions],
+                         'hashtags': [{'text': tag} for tag in hashtags]}
+        self.in_reply_to_screen_name = reply_to
+        if retweet_of is not None:
+            self.retweeted_status = FakeStatus(status_id + 1, retweet_of, created_at, text, [], [], None, None)
+
+class FakeUser(object):
+    def __init__(self, screen_name):
+        self.screen_name = screen_name
+
+""" Serves num_statuses generated statuses per account (newest first), taking
+latency seconds per call and raising tweepy.RateLimitError when more than
+calls_per_window calls are made within window seconds. """
+class FakeTwitterAPI(object):
+    def __init__(self, num_statuses=1000, latency=0.05, calls_per_window=None, window=60 * 15, seed=0):
+        self.num_statuses = num_statuses
+        self.latency = latency
+        self.calls_per_window = calls_per_window
+        self.window = window
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.calls = collections.deque()
+        self.num_calls = 0
+        self.num_rate_limit_errors = 0
+        self.timelines = {}
+
+    """ Returns the full generated timeline of an account, newest first. """
+    def timeline(self, username):
+        with self.lock:
+            if username not in self.timelines:
+                self.timelines[username] = generate_timeline(username, self.num_statuses, self.seed)
+            return self.timelines[username]
+
+    """ Publishes num_new statuses at the top of an account's timeline. """
+    def add_statuses(self, username, num_new):
+        timeline = self.timeline(username)
+        newest = timeline[0]
+        new_statuses = generate_timeline(username, num_new, self.seed + len(timeline))
+        for i in range(num_new):
+            status = new_statuses[i]
+            status.id = newest.id + 2 * (num_new - i)
+            status.created_at = newest.created_at + datetime.timedelta(minutes=num_new - i)
+        with self.lock:
+            self.timelines[username] = new_statuses + timeline
+
+    def user_timeline(self, screen_name=None, count=20, include_rts=True, max_id=None, since_id=None):
+        with self.lock:
+            now = time.time()
+            while len(self.calls) > 0 and self.calls[0] <= now - self.window:
+                self.calls.popleft()
+            if self.calls_per_window is not None and len(self.calls) >= self.calls_per_window:
+                self.num_rate_limit_errors += 1
+                raise tweepy.RateLimitError('Rate limit exceeded')
+            self.calls.append(now)
+            self.num_calls += 1
+        time.sleep(self.latency)
+        page = []
+        for status in self.timeline(screen_name):
+            if max_id is not None and status.id > max_id:
+                continue
+            if since_id is not None and status.id <= since_id:
+                break
+            page.append(status)
+            if len(page) == count:
+                break
+        return page
+
+""" Returns a list of num_statuses generated statuses for a username, newest
+first, with a mix of mentions, hashtags, replies and retweets. """
+def generate_timeline(username, num_statuses, seed=0):
+    rand = random.Random('{}-{}'.format(seed, username))
+    others = ['user{}'.format(i) for i in range(500)]
+    tags = ['tag{}'.format(i) for i in range(200)]
+    base_id = 10 ** 12 + rand.randint(0, 10 ** 9) * 1000
+    newest = datetime.datetime(2016, 12, 30)
+    statuses = []
+    for i in range(num_statuses):
+        status_id = base_id + 2 * (num_statuses - i) # leave room for retweeted status ids
+        created_at = newest - datetime.timedelta(hours=3 * i)
+        mentions = rand.sample(others, rand.randint(0, 3))
+        hashtags = rand.sample(tags, rand.randint(0, 2))
+        reply_to = rand.choice(others) if rand.random() < 0.2 else None
+        retweet_of = rand.choice(others) if rand.random() < 0.3 else None
+        text = u'status {} by {} {}'.format(i, username, ' '.join('#' + tag for tag in hashtags))
+        if retweet_of is not None:
+            text = u'RT @{}: {}'.format(retweet_of, text)
+        statuses.append(FakeStatus(status_id, username, created_at, text, mentions, hashtags, reply_to, retweet_of))
+    return statuses
@@ -0,0 +1,176 @@
+"""
+graph_cache.py
+
+Description: Keeps interaction graphs built from the database (with counted or
+time-decayed weights) on disk as compressed CSR arrays, so scripts that analyze
+the same interaction types do not fetch the edge tables and build the graphs
+again.
+"""
+import csr_graph
+import decayed_graph
+import graph_utils as util
+import hashlib
+import multiplex_graph
+import numpy as np
+import os
+import pandas as pd
+import rollups
+import scipy.sparse as sparse
+
+CACHE_DIR = 'graph_cache'
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 2 # Change when the way graphs are built changes
+
+""" A directory of cached graphs, one npz file per interaction type, subset of
+nodes, weighting and version of the source table. Entries are named
+<interaction type>_<subset key>_<weighting>_<table key>.npz, where the table
+key is a hash of graph_utils.get_edge_table_fingerprint, so a changed table is
+never read from the cache. When the cache grows past max_bytes, the least
+recently used entries are removed. """
+class GraphCache(object):
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.num_hits = 0
+        self.num_misses = 0
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    """ Returns the weighted graph (a csr_graph.CSRGraph) of an interaction type,
+    built by CSRGraph.from_edge_list from the pair counts of get_pair_counts,
+    or only its edges going to a list of nodes, like
+    graph_creator.create_graph_subset, if subset is given. With a half_life,
+    edge weights decay with the age of each interaction (see
+    decayed_graph.DecayedGraph) as of the newest interaction. """
+    def get_graph(self, interaction_type, subset=None, half_life=None):
+        fingerprint = util.get_edge_table_fingerprint(interaction_type)
+        weighting = 'counts' if half_life is None else 'halflife{}'.format(pd.Timedelta(half_life).value)
+        prefix = '{}_{}_{}_'.format(interaction_type, subset_key(subset), weighting)
+        path = os.path.join(self.directory, prefix + hash_key([CACHE_VERSION, fingerprint]) + '.npz')
+        if os.path.exists(path):
+            self.num_hits += 1
+            os.utime(path, None) # mark as recently used
+            return load_graph(path)
+        self.num_misses += 1
+        if half_life is None:
+            g = csr_graph.CSRGraph.from_edge_list(get_pair_counts(interaction_type, fingerprint))
+        else:
+            g = decayed_graph.DecayedGraph.from_edge_list(util.get_edge_list(interaction_type, with_times=True), half_life).graph()
+        if subset is not None:
+            g = g.edges_to(subset)
+        self.remove_entries(prefix)
+        save_graph(g, path)
+        self.evict()
+        return g
+
+    """ Returns the graph from get_graph as a networkx DiGraph. """
+    def get_networkx_graph(self, interaction_type, subset=None, half_life=None):
+        return self.get_graph(interaction_type, subset, half_life).to_networkx()
+
+    """ Returns the multiplex_graph.MultiplexGraph of several interaction types,
+    cached under the fingerprints of all of their tables. """
+    def get_multiplex(self, interaction_types):
+        interaction_types = sorted(interaction_types)
+        fingerprints = [util.get_edge_table_fingerprint(interaction_type) for interaction_type in interaction_types]
+        prefix = 'multiplex_{}_'.format(hash_key(interaction_types))
+        path = os.path.join(self.directory, prefix + hash_key([CACHE_VERSION, fingerprints]) + '.npz')
+        if os.path.exists(path):
+            self.num_hits += 1
+            os.utime(path, None) # mark as recently used
+            return load_multiplex(path)
+        self.num_misses += 1
+        g = multiplex_graph.MultiplexGraph.from_database(interaction_types)
+        self.remove_entries(prefix)
+        save_multiplex(g, path)
+        self.evict()
+        return g
+
+    """ Removes the entries whose names start with a given prefix, i.e. older
+    versions of a graph. """
+    def remove_entries(self, prefix):
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith('.npz'):
+                os.remove(os.path.join(self.directory, name))
+
+    """ Removes the least recently used entries until the cache takes at most
+    max_bytes. The newest entry is kept even if it is larger. """
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                path = os.path.join(self.directory, name)
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+        entries.sort()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+""" Returns the distinct edges of an interaction type with a weight column,
+read from the edge_pair_counts rollup (see rollups.py) when its total weight
+matches the row count in the edge table's fingerprint. Otherwise the rollup is
+out of date, e.g. because edges were loaded without it, and the pairs are
+counted in the database by graph_utils.get_weighted_edge_list. """
+def get_pair_counts(interaction_type, fingerprint):
+    if rollups.get_total(interaction_type) == fingerprint[0]:
+        return rollups.get_weighted_edge_list(interaction_type)
+    print('The {0} rollups are out of date; run python rollups.py rebuild {0}'.format(interaction_type))
+    return util.get_weighted_edge_list(interaction_type)
+
+""" Returns a short hash of the repr of a value. """
+def hash_key(value):
+    return hashlib.sha1(repr(value)).hexdigest()[:16]
+
+""" Returns the part of a cache entry's name that identifies a subset of nodes,
+or 'all' for the full graph. """
+def subset_key(subset):
+    if subset is None:
+        return 'all'
+    return hash_key(sorted(set(subset)))
+
+""" Writes a dictionary of arrays to an npz file, replacing the file only once
+it is fully written. """
+def save_arrays(path, arrays):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+""" Writes a CSRGraph to an npz file. """
+def save_graph(g, path):
+    save_arrays(path, {'names': np.array(g.names, dtype=str), 'indptr': g.out_adj.indptr,
+                       'indices': g.out_adj.indices, 'data': g.out_adj.data})
+
+""" Reads a CSRGraph written by save_graph. """
+def load_graph(path):
+    with np.load(path) as arrays:
+        names = arrays['names'].tolist()
+        indptr = arrays['indptr']
+        indices = arrays['indices']
+        data = arrays['data']
+    start_ids = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    return csr_graph.CSRGraph(names, start_ids, indices, data)
+
+""" Writes a MultiplexGraph to an npz file, with the arrays of each layer
+prefixed by its interaction type. """
+def save_multiplex(g, path):
+    arrays = {'names': np.array(g.names, dtype=str), 'interaction_types': np.array(g.interaction_types, dtype=str)}
+    for interaction_type, layer in g.layers.items():
+        arrays[interaction_type + '_indptr'] = layer.indptr
+        arrays[interaction_type + '_indices'] = layer.indices
+        arrays[interaction_type + '_data'] = layer.data
+    save_arrays(path, arrays)
+
+""" Reads a MultiplexGraph written by save_multiplex. """
+def load_multiplex(path):
+    layers = {}
+    with np.load(path) as arrays:
+        names = arrays['names'].tolist()
+        for interaction_type in arrays['interaction_types'].tolist():
+            layers[interaction_type] = sparse.csr_matrix((arrays[interaction_type + '_data'], arrays[interaction_type + '_indices'],
+                                                          arrays[interaction_type + '_indptr']), shape=(len(names), len(names)))
+    return multiplex_graph.MultiplexGraph(names, layers)
@@ -5,7 +5,9 @@ Description: Creates graphs with interactions as edges and users as nodes.
 """
 from conductance import conductance_score
 import csv
+from decayed_graph import DecayedGraph
 import graph_utils as util
+from graph_cache import GraphCache
 import networkx as nx
 import numpy as np
 import pandas as pd
@@ -14,6 +16,7 @@ import sys
 import degree_vectors as vec
 import clustering as c
 import sklearn.metrics.cluster as cluster
+from user_categories import UserCategories
 
 """ Returns a graph created from a random subset of edges from an edge list. p
 denotes the proportion of edges that are included. """
@@ -21,40 +24,48 @@ def get_rand_subset(edge_list, p):
     edge_subset = edge_list.sample(frac=p, axis=0)
     return edge_subset
 
+""" Returns a list of (start node, end node, weight) tuples with one tuple per
+distinct pair of nodes in the given arrays of edge endpoints, weighted by the
+number of edges between the pair. Self-referencing edges are dropped. If
+directed is False, (a, b) and (b, a) are the same pair, listed in the
+orientation of its first edge. Pairs are listed in order of their first edge. """
+def weighted_edges(start_nodes, end_nodes, directed=True):
+    num_edges = len(start_nodes)
+    codes, uniques = pd.factorize(np.concatenate([start_nodes, end_nodes]))
+    start_codes = codes[:num_edges].astype(np.int64)
+    end_codes = codes[num_edges:].astype(np.int64)
+    # Don't include self-referencing edges
+    keep = np.flatnonzero(start_codes != end_codes)
+    start_codes = start_codes[keep]
+    end_codes = end_codes[keep]
+    if not directed:
+        start_codes, end_codes = np.minimum(start_codes, end_codes), np.maximum(start_codes, end_codes)
+    pair_codes = start_codes * len(uniques) + end_codes
+    pairs, first_index, weights = np.unique(pair_codes, return_index=True, return_counts=True)
+    order = np.argsort(first_index, kind='mergesort')
+    first_rows = keep[first_index[order]]
+    return zip(np.asarray(start_nodes)[first_rows].tolist(), np.asarray(end_nodes)[first_rows].tolist(), weights[order].tolist())
+
 """ Returns a directed graph from an edge list, with edges weighted according to
 the number of interactions between two nodes. """
 def create_graph_edge_weights(edge_list):
-    default_weight = 1
     G = nx.DiGraph()
-    num_edges = edge_list.shape[0]
-    for i in range(num_edges):
-        n0 = edge_list.loc[i, 'start_node']
-        n1 = edge_list.loc[i, 'end_node']
-        # Don't include self-referencing edges
-        if n0 == n1:
-            continue
-        if G.has_edge(n0,n1):
-            G[n0][n1]['weight'] += default_weight
-        else:
-            G.add_edge(n0,n1, weight=default_weight)
+    G.add_weighted_edges_from(weighted_edges(edge_list['start_node'].values, edge_list['end_node'].values))
     return G
 
+""" Returns a directed graph from an edge list with a time_created column, with
+edges weighted by the number of interactions between two nodes, each
+interaction decaying by half every half_life before now (the newest interaction
+by default). """
+def create_graph_decayed_weights(edge_list, half_life, now=None):
+    return DecayedGraph.from_edge_list(edge_list, half_life).graph(now).to_networkx()
+
 """ Returns an undirected graph from an edge list, with edges weighted according
 to the number of interactions between two nodes. """
 def create_undirected_graph_edge_weights(edge_list):
-    default_weight = 1
     G = nx.Graph()
     edge_list.end_node = edge_list.end_node.str.encode('utf-8')
-    for i in range(len(edge_list.index)):
-        n0 = edge_list['start_node'].iloc[i]
-        n1 = edge_list['end_node'].iloc[i]
-        # Don't include self-referencing edges
-        if n0 == n1:
-            continue
-        if G.has_edge(n0,n1):
-            G[n0][n1]['weight'] += default_weight
-        else:
-            G.add_edge(n0,n1, weight=default_weight)
+    G.add_weighted_edges_from(weighted_edges(edge_list['start_node'].values, edge_list['end_node'].values, directed=False))
     return G
 
 """ Returns a subset of a given graph's nodes, including only the ones with a
@@ -242,32 +253,28 @@ nodes. """
 def create_graph_subset(G, node_list):
     return util.get_edges_to(G, node_list)
 
-""" Add user categories as attributes in a given graph. """
-def add_types(g):
+""" Add user categories as attributes in a given graph, using a
+user_categories.UserCategories registry (loaded if not given). Users in no
+category get no attribute. """
+def add_types(g, categories=None):
+    if categories is None:
+        categories = UserCategories.load()
     nodes = g.nodes()
-    length = len(nodes)
-    d = {}
-    for i in range(length):
-        user = nodes[i]
-        if user in c_list:
-            d[user] = 'c'
-        elif user in p_list:
-            d[user] = 'p'
-        elif user in m_list:
-            d[user] = 'm'
+    types = categories.types(nodes)
+    d = dict((user, user_type) for user, user_type in zip(nodes, types) if user_type != 'o')
     nx.set_node_attributes(g, 'type', d)
 
 """ Prints information about attribute mixing. """
 def attribute_info():
+    categories = UserCategories.load()
     c_list, m_list, p_list = util.get_lists()
     cmp_list = util.append_arrays(c_list, m_list, p_list)
 
     interaction_types = ['mentions', 'replies', 'retweets']
+    cache = GraphCache()
     for interaction_type in interaction_types:
-        edge_list = util.get_edge_list(interaction_type)
-        g = create_graph_edge_weights(edge_list)
-        cmp_g = create_graph_subset(g, cmp_list)
-        add_types(cmp_g)
+        cmp_g = cache.get_networkx_graph(interaction_type, cmp_list)
+        add_types(cmp_g, categories)
         print('{} Assortativity: '.format(interaction_type), nx.attribute_assortativity_coefficient(cmp_g,'type'))
         print('{} Mixing: '.format(interaction_type), nx.attribute_mixing_dict(cmp_g, 'type', normalized=True))
 
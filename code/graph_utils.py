@@ -3,11 +3,14 @@ graph_utils.py
 
 Descrition: Utility methods
 """
+import csr_graph
 import networkx as nx
 import numpy as np
 import numpy.lib.recfunctions as rec
 import pandas as pd
-import pymysql.cursors
+import storage
+import user_categories
+import usernames
 
 """ Returns an array created by appending all the rows in a given set of arrays. """
 def append_arrays(*args):
@@ -22,60 +25,225 @@ def array_from_file(start_col, end_col, array_file, skiprows):
     info = np.char.lower(np.loadtxt(array_file, usecols = range(start_col,end_col), dtype=str, delimiter=',', skiprows=skiprows))
     return info
 
-""" Given a list of users in each category, labels each user in a given list. """
-def add_types(users, c_list, m_list, p_list):
-    length = vector.shape[0]
-    for i in range(length):
-        user = users[i]['name']
-        if user in c_list:
-            users[i]['type'] = 'c'
-        elif user in p_list:
-            users[i]['type'] = 'p'
-        elif user in m_list:
-            users[i]['type'] = 'm'
-        else:
-            users[i]['type'] = 'o'
+""" Given a user_categories.UserCategories registry, labels each user in a
+given array with 'name' and 'type' fields. """
+def add_types(users, categories):
+    users['type'] = categories.types(users['name'])
     return
 
 """ Returns a list of edges corresponding to a given interaction type from the
-database."""
-def get_edge_list(interaction_type):
-    connection = pymysql.connect(host='localhost',
-                                user='root',
-                                password='password',
-                                db='iw03',
-                                charset='utf8mb4',
-                                cursorclass=pymysql.cursors.DictCursor)
-    try:
+database. With with_times, the list also has a time_created column. The rows
+are streamed in batches (see iter_edge_batches), so only the columns of the
+result are built up rather than a Python object per row. """
+def get_edge_list(interaction_type, with_times=False):
+    columns = ['start_node', 'end_node'] + (['time_created'] if with_times else [])
+    batches = list(iter_edge_batches(interaction_type, with_times))
+    if len(batches) == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(batches, ignore_index=True)
+
+""" Yields the edges of a given interaction type from the database as edge
+lists of up to batch_size rows, like get_edge_list's. Rows are read from a
+streaming cursor as tuples, so only one batch is held in memory at a time and
+the first batch arrives before the whole table has been read. """
+def iter_edge_batches(interaction_type, with_times=False, batch_size=storage.FETCH_SIZE):
+    columns = ['start_node', 'end_node'] + (['time_created'] if with_times else [])
+    sql = "SELECT {} FROM {}_edges".format(', '.join('`{}`'.format(column) for column in columns), interaction_type)
+    with storage.connection() as connection:
+        with connection.streaming_cursor() as cursor:
+            cursor.execute(sql)
+            for rows in storage.fetch_batches(cursor, batch_size):
+                edge_list = normalize_edge_list(pd.DataFrame.from_records(rows, columns=columns))
+                if with_times:
+                    edge_list['time_created'] = pd.to_datetime(edge_list['time_created'])
+                yield edge_list
+        connection.commit()
+
+""" Returns the distinct edges of a given interaction type from the database
+with a weight column counting the interactions between each pair of nodes,
+optionally only those created at or after start and before end. The counting
+is done by the database (GROUP BY, helped by the indexes of
+storage.add_edge_indexes), so one row per pair is transferred instead of one per
+interaction. Pairs whose names become equal once normalized are added up. """
+def get_weighted_edge_list(interaction_type, start=None, end=None, batch_size=storage.FETCH_SIZE):
+    conditions = []
+    args = []
+    if start is not None:
+        conditions.append("`time_created` >= %s")
+        args.append(str(pd.Timestamp(start)))
+    if end is not None:
+        conditions.append("`time_created` < %s")
+        args.append(str(pd.Timestamp(end)))
+    where = " WHERE " + " AND ".join(conditions) if len(conditions) > 0 else ""
+    sql = "SELECT `start_node`, `end_node`, COUNT(*) FROM {}_edges{} GROUP BY `start_node`, `end_node`".format(interaction_type, where)
+    columns = ['start_node', 'end_node', 'weight']
+    batches = []
+    with storage.connection() as connection:
+        with connection.streaming_cursor() as cursor:
+            cursor.execute(sql, args or None)
+            for rows in storage.fetch_batches(cursor, batch_size):
+                batches.append(normalize_edge_list(pd.DataFrame.from_records(rows, columns=columns)))
+        connection.commit()
+    if len(batches) == 0:
+        return pd.DataFrame(columns=columns)
+    edge_list = pd.concat(batches, ignore_index=True)
+    edge_list['weight'] = edge_list['weight'].astype(np.int64)
+    return edge_list.groupby(['start_node', 'end_node'], sort=False)['weight'].sum().reset_index()
+
+""" Returns a single edge list with the edges of several interaction types,
+fetched with one query, with an interaction_type column naming the table each
+edge came from. """
+def get_multiplex_edge_list(interaction_types):
+    with storage.connection() as connection:
         with connection.cursor() as cursor:
-            sql = "SELECT `start_node`, `end_node` FROM {}_edges"
-            cursor.execute(sql.format(interaction_type))
+            sql = "SELECT '{0}' AS `interaction_type`, `start_node`, `end_node` FROM {0}_edges"
+            cursor.execute(" UNION ALL ".join(sql.format(interaction_type) for interaction_type in interaction_types))
             results = cursor.fetchall()
-            edge_list = pd.DataFrame(results)
-            edge_list['start_node'] = map(lambda x: str(x).lower(), edge_list['start_node'])
-            edge_list.end_node = edge_list.end_node.str.encode("ascii", "ignore")
-            edge_list['end_node'] = map(lambda x: str(x).lower(), edge_list['end_node'])
+            edge_list = normalize_edge_list(pd.DataFrame(list(results), columns=['interaction_type', 'start_node', 'end_node']))
             connection.commit()
-    finally:
-        connection.close()
     return edge_list
 
+""" Converts the node names of an edge list fetched from the database to
+lowercase strings, dropping non-ASCII characters from end nodes. """
+def normalize_edge_list(edge_list):
+    edge_list['start_node'] = usernames.normalize_names(edge_list['start_node'].values)
+    edge_list['end_node'] = usernames.normalize_names(edge_list['end_node'].values, ascii_only=True)
+    return edge_list
+
+""" Returns the edges of a given interaction type from the database as two
+int32 arrays of start and end node ids in a usernames.UsernameTable (the
+persisted table by default), with names normalized as in get_edge_list. New
+names are added to the table and saved. The edges are read a batch at a time,
+so names are only held for one batch. """
+def get_edge_ids(interaction_type, table=None):
+    if table is None:
+        table = usernames.UsernameTable()
+    start_ids = [np.zeros(0, dtype=np.int32)]
+    end_ids = [np.zeros(0, dtype=np.int32)]
+    for edge_list in iter_edge_batches(interaction_type):
+        start_ids.append(table.ids(edge_list['start_node'].values))
+        end_ids.append(table.ids(edge_list['end_node'].values))
+    remap = table.save()
+    return remap[np.concatenate(start_ids)], remap[np.concatenate(end_ids)]
+
+""" Returns a fingerprint of the edge table of a given interaction type: its
+row count, largest id and the sum of a CRC32 checksum of each row's start_node,
+end_node and time_created. Adding or removing rows changes it, and so does
+editing a name or time, unless the edit happens to leave the sum of checksums
+unchanged (a chance of about one in four billion per edit). """
+def get_edge_table_fingerprint(interaction_type):
+    with storage.connection() as connection:
+        with connection.cursor() as cursor:
+            checksum = storage.row_checksum_sql(['start_node', 'end_node', 'time_created'], connection)
+            sql = "SELECT COUNT(*), MAX(`id`), SUM({}) FROM {}_edges"
+            cursor.execute(sql.format(checksum, interaction_type))
+            count, max_id, checksum = cursor.fetchone()
+            connection.commit()
+    return (int(count), int(max_id or 0), int(checksum or 0))
+
+""" Returns a set of the nodes in a list or array, or the nodes themselves if
+they are already a set. """
+def node_set(nodes):
+    if isinstance(nodes, (set, frozenset)):
+        return nodes
+    return set(nodes)
+
+""" Returns a graph with only the edges of G that start from a node in
+from_nodes and end at a node in to_nodes, in a single pass over the edges. Either
+may be None to leave that end unfiltered. For a networkx graph, the nodes are
+given as a list, array or set; for a csr_graph.CSRGraph they may also be a
+boolean mask over its node ids, and the edges are filtered with array masks. """
+def filter_edges(G, from_nodes=None, to_nodes=None):
+    if isinstance(G, csr_graph.CSRGraph):
+        return G.filter_edges(from_nodes, to_nodes)
+    from_set = node_set(from_nodes) if from_nodes is not None else None
+    to_set = node_set(to_nodes) if to_nodes is not None else None
+    if from_set is None and to_set is None:
+        edges = G.edges(data=True)
+    elif from_set is None:
+        edges = [(u,v,d) for u,v,d in G.edges_iter(data=True) if v in to_set]
+    elif to_set is None:
+        edges = [(u,v,d) for u,v,d in G.edges_iter(data=True) if u in from_set]
+    else:
+        edges = [(u,v,d) for u,v,d in G.edges_iter(data=True) if u in from_set and v in to_set]
+    return nx.DiGraph(edges)
+
 """ Returns graph with edges starting from a certain list of nodes."""
 def get_edges_from(G, list):
-    G=nx.DiGraph( [ (u,v,d) for u,v,d in G.edges(data=True) if u in list])
-    return G
+    return filter_edges(G, from_nodes=list)
 
 """ Returns graph with edges going to a certain list of nodes."""
 def get_edges_to(G, nodes_list):
-    G=nx.DiGraph( [ (u,v,d) for u,v,d in G.edges(data=True) if v in nodes_list])
-    return G
+    return filter_edges(G, to_nodes=nodes_list)
+
+WRITE_BATCH_SIZE = 10000 # Rows per executemany call when writing degree vectors
+
+VECTOR_PRECEDENCE = ['p', 'm', 'c'] # Type of users in several lists in the *vectors tables
+
+""" Columns of a degree vector, in the order of the *vectors tables. """
+DEGREE_COLUMNS = ['p_indeg', 'm_indeg', 'c_indeg', 'p_outdeg', 'm_outdeg', 'c_outdeg', 't_outdeg', 'o_outdeg']
+
+""" Returns a dataframe with the name and degree vector of every node of G (a
+networkx graph or csr_graph.CSRGraph): its weighted in-degree from and
+out-degree to the users in each of the lists of celebrities, media outlets and
+politicians, its total weighted out-degree, and its out-degree to other users
+(t_outdeg - p_outdeg - m_outdeg - c_outdeg, so a user in several lists counts
+once for each). Rather than filtering a subgraph per list, the adjacency matrix
+and its transpose are each multiplied once by a matrix with a row per node and
+a column per list marking the lists the node is in. """
+def get_degree_vectors(G, c_list, m_list, p_list):
+    if not isinstance(G, csr_graph.CSRGraph):
+        G = csr_graph.CSRGraph.from_networkx(G)
+    membership = np.zeros((G.number_of_nodes(), 3), dtype=G.out_adj.dtype)
+    for j, nodes in enumerate([p_list, m_list, c_list]):
+        membership[G.node_mask(nodes), j] = 1
+    in_from = G.in_adj.dot(membership)
+    out_to = G.out_adj.dot(membership)
+    t_outdeg = G.out_degree(weighted=True)
+    vectors = pd.DataFrame({'name': G.names}, columns=['name'] + DEGREE_COLUMNS)
+    for j, category in enumerate(['p', 'm', 'c']):
+        vectors['{}_indeg'.format(category)] = in_from[:, j]
+        vectors['{}_outdeg'.format(category)] = out_to[:, j]
+    vectors['t_outdeg'] = t_outdeg
+    vectors['o_outdeg'] = t_outdeg - out_to.sum(axis=1)
+    return vectors
+
+""" Returns an array with the type of each user in an array of names: 'p',
+'m' or 'c' for users in the lists of politicians, media outlets or celebrities,
+or 'o' for others, looked up in a user_categories.UserCategories registry. A
+user in several lists gets the type that the UPDATEs of degrees_into_database
+used to leave (VECTOR_PRECEDENCE), so the *vectors tables keep their types;
+clustering and the json output use the registry's default precedence. """
+def get_vector_types(names, c_list, m_list, p_list):
+    categories = user_categories.UserCategories(c_list, m_list, p_list, precedence=VECTOR_PRECEDENCE)
+    return categories.types(names)
+
+""" Replaces the rows of a degree vector table with the vectors from
+get_degree_vectors, typed by get_vector_types. The rows are written whole, in
+batches of multi-row INSERTs, in a single transaction. """
+def write_degree_vectors(vectors, c_list, m_list, p_list, table_name):
+    columns = ['name', 'type'] + DEGREE_COLUMNS
+    values = [vectors['name'].tolist(), get_vector_types(vectors['name'].values, c_list, m_list, p_list).tolist()]
+    values += [vectors[column].tolist() for column in DEGREE_COLUMNS]
+    rows = zip(*values)
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(table_name, ', '.join('`{}`'.format(column) for column in columns), ', '.join(['%s'] * len(columns)))
+    with storage.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {}".format(table_name))
+            for i in range(0, len(rows), WRITE_BATCH_SIZE):
+                cursor.executemany(sql, rows[i:i + WRITE_BATCH_SIZE])
+        connection.commit()
+
+""" Labeled lists of celebrities, media outlets, and politicians read by
+get_list_dfs. NOTE: Hardcoded filenames. """
+LABELED_LIST_FILES = ["C:\Users\Cathy\Documents\Courses\\2016-2017\IW03\Data\celebritieslistlabeled.csv",
+                      "C:\Users\Cathy\Documents\Courses\\2016-2017\IW03\Data\medialistlabeled.csv",
+                      "C:\Users\Cathy\Documents\Courses\\2016-2017\IW03\Data\politicianslistlabeled.csv"]
 
 """ Returns dataframes with info about celebrities, media outlets, and
 politicians. NOTE: Contains hadcoded filenames. """
 def get_list_dfs():
-    c_file = "C:\Users\Cathy\Documents\Courses\\2016-2017\IW03\Data\celebritieslistlabeled.csv"
-    m_file = "C:\Users\Cathy\Documents\Courses\\2016-2017\IW03\Data\medialistlabeled.csv"
-    p_file = "C:\Users\Cathy\Documents\Courses\\2016-2017\IW03\Data\politicianslistlabeled.csv"
+    c_file, m_file, p_file = LABELED_LIST_FILES
     dtypes = {'User': str, 'Name': str, 'Following': str, 'Followers': str, 'Affiliation': str, 'Description': str}
     c_df = pd.read_csv(c_file, header=0, names=['User', 'Name', 'Following', 'Followers', 'Description'], index_col=False, dtype=dtypes)
     c_df.User = c_df.User.str.lower()
@@ -87,32 +255,24 @@ def get_list_dfs():
 
 """ Returns lists of celebrities, media outlets, and politicians. """
 def get_lists():
-    connection = pymysql.connect(host='localhost',
-                                user='root',
-                                password='password',
-                                db='iw03',
-                                charset='utf8mb4',
-                                cursorclass=pymysql.cursors.DictCursor)
-    try:
+    with storage.connection() as connection:
         with connection.cursor() as cursor:
             sql = "SELECT `name` FROM {}"
 
             cursor.execute(sql.format('`c_list`'))
             results = cursor.fetchall()
-            c_list = pd.DataFrame(results)
-            c_list['name'] = map(lambda x: str(x).lower(), c_list['name'])
+            c_list = pd.DataFrame(list(results), columns=['name'])
+            c_list['name'] = usernames.normalize_names(c_list['name'].values)
 
             cursor.execute(sql.format('`m_list`'))
             results = cursor.fetchall()
-            m_list = pd.DataFrame(results)
-            m_list['name'] = map(lambda x: str(x).lower(), m_list['name'])
+            m_list = pd.DataFrame(list(results), columns=['name'])
+            m_list['name'] = usernames.normalize_names(m_list['name'].values)
 
             cursor.execute(sql.format('`p_list`'))
             results = cursor.fetchall()
-            p_list = pd.DataFrame(results)
-            p_list['name'] = map(lambda x: str(x).lower(), p_list['name'])
+            p_list = pd.DataFrame(list(results), columns=['name'])
+            p_list['name'] = usernames.normalize_names(p_list['name'].values)
 
         connection.commit()
-    finally:
-        connection.close()
     return c_list['name'].values.tolist(), m_list['name'].values.tolist(), p_list['name'].values.tolist()
@@ -0,0 +1,185 @@
+"""
+incremental_degrees.py
+
+Description: Keeps the degree vectors of the *vectors tables (see
+graph_utils.get_degree_vectors) up to date as new interaction edges arrive.
+A batch of edges only changes the vectors of the users it touches, so the
+vectors are updated by the batch's contributions instead of recomputed.
+
+Usage: python incremental_degrees.py update <interaction type> <edges csv> [<edges csv> ...]
+Adds batches of edges (csv files of start_node, end_node, time_created rows,
+like the ones bulk_loader.py loads) to <interaction type>vectors. The batches
+are combined in memory and written in one transaction. They should be the
+edges added to the edge table, or verify will find differences.
+python incremental_degrees.py verify <interaction type>
+Compares <interaction type>vectors with a full recompute from the edge table.
+"""
+from csr_graph import CSRGraph
+import csv
+import graph_utils as util
+import numpy as np
+import pandas as pd
+import storage
+import sys
+
+""" Returns a dataframe with a row per user touched by a batch of edges (an
+edge list with start_node and end_node columns and optionally a weight column,
+with normalized names) holding the amount the batch adds to each column of the
+user's degree vector. Self-referencing edges are skipped, as in the graphs the
+vectors are computed from. The work is proportional to the size of the batch. """
+def degree_deltas(edge_list, c_list, m_list, p_list):
+    start_nodes = edge_list['start_node'].values
+    end_nodes = edge_list['end_node'].values
+    # Don't include self-referencing edges
+    keep = start_nodes != end_nodes
+    weights = edge_list['weight'].values[keep].astype(np.int64) if 'weight' in edge_list else np.ones(keep.sum(), dtype=np.int64)
+    num_edges = len(weights)
+    codes, names = pd.factorize(np.concatenate([start_nodes[keep], end_nodes[keep]]))
+    start_ids = codes[:num_edges]
+    end_ids = codes[num_edges:]
+    num_names = len(names)
+    membership = np.zeros((num_names, 3), dtype=bool)
+    for j, nodes in enumerate([p_list, m_list, c_list]):
+        membership[:, j] = pd.Series(np.asarray(names, dtype=object)).isin(util.node_set(nodes)).values
+    deltas = pd.DataFrame({'name': np.asarray(names, dtype=object)}, columns=['name'] + util.DEGREE_COLUMNS)
+    for j, category in enumerate(['p', 'm', 'c']):
+        from_category = membership[start_ids, j]
+        to_category = membership[end_ids, j]
+        deltas['{}_indeg'.format(category)] = np.bincount(end_ids[from_category], weights[from_category], minlength=num_names).astype(np.int64)
+        deltas['{}_outdeg'.format(category)] = np.bincount(start_ids[to_category], weights[to_category], minlength=num_names).astype(np.int64)
+    deltas['t_outdeg'] = np.bincount(start_ids, weights, minlength=num_names).astype(np.int64)
+    deltas['o_outdeg'] = deltas['t_outdeg'] - deltas['p_outdeg'] - deltas['m_outdeg'] - deltas['c_outdeg']
+    return deltas
+
+""" Degree vectors held in memory, with a row per user in an array that grows
+as new users appear, so a batch of edges is applied in time proportional to its
+size. """
+class DegreeVectors(object):
+    def __init__(self, c_list, m_list, p_list):
+        self.lists = [util.node_set(c_list), util.node_set(m_list), util.node_set(p_list)]
+        self.names = []
+        self.index = {}
+        self.values = np.zeros((16, len(util.DEGREE_COLUMNS)), dtype=np.int64)
+
+    """ Returns the degree vectors of a dataframe from
+    graph_utils.get_degree_vectors. """
+    @classmethod
+    def from_frame(cls, vectors, c_list, m_list, p_list):
+        degree_vectors = cls(c_list, m_list, p_list)
+        degree_vectors.add(vectors)
+        return degree_vectors
+
+    """ Returns the row of each name in a list, adding rows of zeros for new
+    names. """
+    def rows(self, names):
+        rows = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            row = self.index.get(name)
+            if row is None:
+                row = len(self.names)
+                self.index[name] = row
+                self.names.append(name)
+            rows[i] = row
+        if len(self.names) > len(self.values):
+            values = np.zeros((max(len(self.names), 2 * len(self.values)), self.values.shape[1]), dtype=np.int64)
+            values[:len(self.values)] = self.values
+            self.values = values
+        return rows
+
+    """ Adds a dataframe of degree vector columns by name (e.g. from
+    degree_deltas) to the vectors. """
+    def add(self, deltas):
+        rows = self.rows(deltas['name'].tolist())
+        np.add.at(self.values, rows, deltas[util.DEGREE_COLUMNS].values.astype(np.int64))
+
+    """ Applies a batch of edges (see degree_deltas) and returns its deltas, so
+    they can also be written with write_deltas. """
+    def update(self, edge_list):
+        deltas = degree_deltas(edge_list, *self.lists)
+        self.add(deltas)
+        return deltas
+
+    """ Returns the vectors as a dataframe like graph_utils.get_degree_vectors. """
+    def to_frame(self):
+        vectors = pd.DataFrame(self.values[:len(self.names)], columns=util.DEGREE_COLUMNS)
+        vectors.insert(0, 'name', np.asarray(self.names, dtype=object))
+        return vectors
+
+""" Adds the deltas of a batch of edges to a degree vector table in one
+transaction, inserting rows, typed by graph_utils.get_vector_types, for users
+not in it yet. """
+def write_deltas(deltas, c_list, m_list, p_list, table_name):
+    types = util.get_vector_types(deltas['name'].values, c_list, m_list, p_list)
+    rows = zip(deltas['name'].tolist(), types.tolist(), *[deltas[column].tolist() for column in util.DEGREE_COLUMNS])
+    with storage.connection() as connection:
+        storage.add_unique_name(connection, table_name)
+        sql = storage.upsert_sql(table_name, ['name'], util.DEGREE_COLUMNS, True, connection, fixed=['type'])
+        with connection.cursor() as cursor:
+            for i in range(0, len(rows), util.WRITE_BATCH_SIZE):
+                cursor.executemany(sql, rows[i:i + util.WRITE_BATCH_SIZE])
+        connection.commit()
+
+""" Returns the rows of a degree vector table as a dataframe with name, type
+and degree columns. """
+def read_vectors(table_name):
+    columns = ['name', 'type'] + util.DEGREE_COLUMNS
+    with storage.connection() as connection:
+        with connection.streaming_cursor() as cursor:
+            cursor.execute("SELECT {} FROM {}".format(', '.join('`{}`'.format(column) for column in columns), table_name))
+            rows = [row for batch in storage.fetch_batches(cursor) for row in batch]
+        connection.commit()
+    return pd.DataFrame(rows, columns=columns)
+
+""" Compares stored degree vectors with expected ones (both dataframes with
+name, type and degree columns). Returns the numbers of users missing from the
+stored vectors, stored but not expected, and stored with different values. """
+def compare_vectors(expected, stored):
+    columns = ['type'] + util.DEGREE_COLUMNS
+    expected = expected.assign(name=expected['name'].astype(object))
+    stored = stored.assign(name=stored['name'].astype(object))
+    merged = pd.merge(expected, stored, on='name', how='outer', suffixes=('_expected', '_stored'), indicator=True)
+    both = (merged['_merge'] == 'both').values
+    different = np.zeros(len(merged), dtype=bool)
+    for column in columns:
+        different |= both & (merged[column + '_expected'] != merged[column + '_stored']).values
+    return {'missing': int((merged['_merge'] == 'left_only').sum()),
+            'extra': int((merged['_merge'] == 'right_only').sum()),
+            'different': int(different.sum())}
+
+""" Compares the degree vector table of an interaction type with the vectors
+recomputed from its whole edge table (see compare_vectors). The pairs are
+counted from the edge table itself rather than read from the rollups. """
+def verify(interaction_type, c_list, m_list, p_list):
+    g = CSRGraph.from_edge_list(util.get_weighted_edge_list(interaction_type))
+    expected = util.get_degree_vectors(g, c_list, m_list, p_list)
+    expected['type'] = util.get_vector_types(expected['name'].values, c_list, m_list, p_list)
+    return compare_vectors(expected, read_vectors('`{}vectors`'.format(interaction_type)))
+
+""" Returns the edges of a csv file of start_node, end_node, time_created rows
+as an edge list with names normalized as if read from the database. """
+def read_edge_file(file_name):
+    with open(file_name, 'rb') as f:
+        rows = [(row[0].decode('utf-8', 'ignore'), row[1].decode('utf-8', 'ignore')) for row in csv.reader(f)]
+    return util.normalize_edge_list(pd.DataFrame(rows, columns=['start_node', 'end_node']))
+
+def main():
+    command = sys.argv[1]
+    interaction_type = sys.argv[2]
+    c_list, m_list, p_list = util.get_lists()
+    if command == 'update':
+        batches = DegreeVectors(c_list, m_list, p_list)
+        for file_name in sys.argv[3:]:
+            batches.update(read_edge_file(file_name))
+        deltas = batches.to_frame()
+        write_deltas(deltas, c_list, m_list, p_list, '`{}vectors`'.format(interaction_type))
+        print('Updated the vectors of {} users'.format(len(deltas)))
+    elif command == 'verify':
+        differences = verify(interaction_type, c_list, m_list, p_list)
+        print('{} missing, {} extra, {} different'.format(differences['missing'], differences['extra'], differences['different']))
+        if sum(differences.values()) > 0:
+            sys.exit(1)
+    else:
+        raise ValueError('Unknown command {}'.format(command))
+
+if __name__ == "__main__":
+    main()
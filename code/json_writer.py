@@ -6,22 +6,19 @@ Description: Writes json files with nodes and edges of interaction graphs.
 
 import graph_creator as gc
 import graph_utils as util
+from graph_cache import GraphCache
 import networkx as nx
+from user_categories import UserCategories
+
+COLORS = {'c': 'red', 'p': 'green', 'm': 'blue'}
 
 """ Add user categories as attributes in a given graph. """
-def add_colors(g):
-    c_list, m_list, p_list = util.get_lists()
+def add_colors(g, categories=None):
+    if categories is None:
+        categories = UserCategories.load()
     nodes = g.nodes()
-    length = len(nodes)
-    d = {}
-    for i in range(length):
-        user = nodes[i]
-        if user in c_list:
-            d[user] = 'red'
-        elif user in p_list:
-            d[user] = 'green'
-        elif user in m_list:
-            d[user] = 'blue'
+    types = categories.types(nodes)
+    d = dict((user, COLORS[user_type]) for user, user_type in zip(nodes, types) if user_type in COLORS)
     nx.set_node_attributes(g, 'color', d)
 
 def write_graph_to_json(json_file, g, id_name):
@@ -71,17 +68,17 @@ def write_graph_to_json(json_file, g, id_name):
 
 def main():
     interaction_types = ['mentions', 'replies', 'retweets']
+    cache = GraphCache()
+    categories = UserCategories.load()
 
     for interaction_type in interaction_types:
-            edge_list = util.get_edge_list(interaction_type)
             c_list, m_list, p_list = util.get_lists()
             c_df, m_df, p_df = util.get_list_dfs()
             node_lists = [c_list, m_list, p_list]
             node_labels = ["celebrities", "media", "politicians", "others"]
             cmp_list = util.append_arrays(c_list, m_list, p_list)
-            g = gc.create_graph_edge_weights(edge_list)
-            cmp_g = gc.create_graph_subset(g, cmp_list)
-            add_colors(cmp_g)
+            cmp_g = cache.get_networkx_graph(interaction_type, cmp_list)
+            add_colors(cmp_g, categories)
             filename = "{}.json".format(interaction_type)
             json_file = open(filename, 'w')
             print "filename: %s" % filename
@@ -0,0 +1,116 @@
+"""
+multiplex_graph.py
+
+Description: A multiplex interaction graph, with one weighted layer per
+interaction type over a single shared index of users, so layers can be compared
+and combined without aligning node names.
+"""
+import csr_graph
+import graph_utils as util
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+import usernames
+
+""" Layers of interaction edges over the same nodes. names[i] is the username
+of node i in every layer, and layers maps each interaction type to a sparse
+out-adjacency matrix in CSR form whose entries count the interactions of that
+type between two users. """
+class MultiplexGraph(object):
+    def __init__(self, names, layers):
+        self.names = list(names)
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.layers = layers
+        self.interaction_types = sorted(layers.keys())
+
+    """ Returns a multiplex graph from an edge list with interaction_type,
+    start_node and end_node columns (see graph_utils.get_multiplex_edge_list).
+    Self-referencing edges are dropped and every layer is weighted the same way
+    as graph_creator.create_graph_edge_weights. interaction_types lists the
+    layers to create, so a type without edges still gets an empty layer. """
+    @classmethod
+    def from_edge_list(cls, edge_list, interaction_types=None):
+        if interaction_types is None:
+            interaction_types = sorted(set(edge_list['interaction_type']))
+        start_nodes = edge_list['start_node'].values
+        end_nodes = edge_list['end_node'].values
+        # Don't include self-referencing edges
+        keep = start_nodes != end_nodes
+        num_edges = keep.sum()
+        # Interleave so nodes are numbered in the order they first appear
+        endpoints = np.empty(2 * num_edges, dtype=object)
+        endpoints[0::2] = start_nodes[keep]
+        endpoints[1::2] = end_nodes[keep]
+        codes, names = pd.factorize(endpoints)
+        start_ids = codes[0::2]
+        end_ids = codes[1::2]
+        edge_types = edge_list['interaction_type'].values[keep]
+        num_nodes = len(names)
+        layers = {}
+        for interaction_type in interaction_types:
+            rows = edge_types == interaction_type
+            layers[interaction_type] = sparse.csr_matrix((np.ones(rows.sum(), dtype=np.int64), (start_ids[rows], end_ids[rows])), shape=(num_nodes, num_nodes))
+            layers[interaction_type].sum_duplicates()
+        return cls(names, layers)
+
+    """ Returns a multiplex graph from a list of names and a dictionary mapping
+    each interaction type to arrays of start and end node ids into names (see
+    graph_utils.get_edge_ids). Only names with edges become nodes, numbered in
+    the order of their ids, and the layers are built as in from_edge_list. """
+    @classmethod
+    def from_edge_ids(cls, names, edge_ids):
+        kept = {}
+        for interaction_type, (start_ids, end_ids) in edge_ids.items():
+            # Don't include self-referencing edges
+            keep = start_ids != end_ids
+            kept[interaction_type] = (start_ids[keep], end_ids[keep])
+        used = np.unique(np.concatenate([np.zeros(0, dtype=np.int32)] + [ids for pair in kept.values() for ids in pair]))
+        node_ids = np.zeros(len(names), dtype=np.int64)
+        node_ids[used] = np.arange(len(used))
+        num_nodes = len(used)
+        layers = {}
+        for interaction_type, (start_ids, end_ids) in kept.items():
+            layers[interaction_type] = sparse.csr_matrix((np.ones(len(start_ids), dtype=np.int64), (node_ids[start_ids], node_ids[end_ids])), shape=(num_nodes, num_nodes))
+            layers[interaction_type].sum_duplicates()
+        return cls([names[i] for i in used], layers)
+
+    """ Returns the multiplex graph of the given interaction types, read from
+    the database as int32 ids in a usernames.UsernameTable (the persisted table
+    by default), so every layer is numbered by the same table without building
+    an edge list of names. """
+    @classmethod
+    def from_database(cls, interaction_types, table=None):
+        if table is None:
+            table = usernames.UsernameTable()
+        edge_ids = dict((interaction_type, util.get_edge_ids(interaction_type, table)) for interaction_type in interaction_types)
+        return cls.from_edge_ids(table.names, edge_ids)
+
+    def number_of_nodes(self):
+        return len(self.names)
+
+    """ Returns a csr_graph.CSRGraph view of one layer. It shares the adjacency
+    matrix and the node index of the multiplex graph, so it includes users with
+    no edges of this type; use its compact() method for a graph with only the
+    users in the layer. """
+    def layer(self, interaction_type):
+        return csr_graph.CSRGraph.from_matrix(self.names, self.layers[interaction_type], self.index)
+
+    """ Returns a CSRGraph view whose edge weights are the sum of the weights
+    of several layers (all of them by default), each multiplied by its entry in
+    coefficients if given. """
+    def aggregate(self, interaction_types=None, coefficients=None):
+        if interaction_types is None:
+            interaction_types = self.interaction_types
+        total = sparse.csr_matrix((len(self.names), len(self.names)), dtype=np.int64)
+        for interaction_type in interaction_types:
+            coefficient = coefficients[interaction_type] if coefficients is not None else 1
+            total = total + coefficient * self.layers[interaction_type]
+        return csr_graph.CSRGraph.from_matrix(self.names, total, self.index)
+
+    """ Returns an array with one row per node and one column per interaction
+    type (in the order of interaction_types) holding each node's weighted
+    out-degree, or in-degree if direction is 'in', in every layer. """
+    def degree_matrix(self, direction='out'):
+        axis = 1 if direction == 'out' else 0
+        columns = [np.asarray(self.layers[interaction_type].sum(axis=axis)).ravel() for interaction_type in self.interaction_types]
+        return np.column_stack(columns) if len(columns) > 0 else np.zeros((len(self.names), 0), dtype=np.int64)
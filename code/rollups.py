@@ -0,0 +1,226 @@
+"""
+rollups.py
+
+Description: Keeps rollup tables of the interaction edges up to date as edges
+are inserted: the number of interactions between each pair of users
+(edge_pair_counts), the number of interactions each user started and received
+(user_counts) and the number of interactions on each day (daily_counts), for
+every interaction type. Analyses can read these small tables instead of
+scanning the edge tables. Names are normalized as in graph_utils.
+
+Usage: python rollups.py rebuild|check [<interaction type> ...]
+rebuild recomputes the rollups of the given interaction types (all by default)
+from the edge tables, and check compares them with a recompute without
+changing them. Do not run rebuild while the collector is writing.
+"""
+import graph_utils as util
+import numpy as np
+import pandas as pd
+import storage
+import sys
+import usernames
+
+""" Rollup tables in MySQL syntax. The SQLite versions are in
+storage.SQLITE_SCHEMA. """
+MYSQL_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS `edge_pair_counts` (`interaction_type` VARCHAR(16) NOT NULL,
+        `start_node` VARCHAR(191) NOT NULL, `end_node` VARCHAR(191) NOT NULL, `weight` BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (`interaction_type`, `start_node`, `end_node`)) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin""",
+    """CREATE TABLE IF NOT EXISTS `user_counts` (`interaction_type` VARCHAR(16) NOT NULL, `name` VARCHAR(191) NOT NULL,
+        `out_count` BIGINT NOT NULL DEFAULT 0, `in_count` BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (`interaction_type`, `name`)) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin""",
+    """CREATE TABLE IF NOT EXISTS `daily_counts` (`interaction_type` VARCHAR(16) NOT NULL, `day` DATE NOT NULL,
+        `count` BIGINT NOT NULL DEFAULT 0, PRIMARY KEY (`interaction_type`, `day`))""",
+]
+
+""" Key and value columns of each rollup table. """
+ROLLUPS = {'edge_pair_counts': (['interaction_type', 'start_node', 'end_node'], ['weight']),
+           'user_counts': (['interaction_type', 'name'], ['out_count', 'in_count']),
+           'daily_counts': (['interaction_type', 'day'], ['count'])}
+BATCH_SIZE = 10000 # Rows per executemany call
+
+""" Creates the rollup tables in a MySQL database that does not have them yet.
+SQLite databases opened with storage.connect_sqlite already have them. """
+def create_tables(connection):
+    if storage.is_sqlite(connection):
+        return
+    cursor = connection.cursor()
+    try:
+        for sql in MYSQL_SCHEMA:
+            cursor.execute(sql)
+        connection.commit()
+    finally:
+        cursor.close()
+
+""" Returns the normalized form of a name (see usernames), decoding byte
+strings first since the database returns names as unicode, so rollups of
+inserted rows match those recomputed from the tables. """
+def normalize(name, ascii_only):
+    if isinstance(name, str):
+        name = name.decode('utf-8', 'ignore')
+    return usernames.normalize_ascii_name(name) if ascii_only else usernames.normalize_name(name)
+
+""" Rollup counts of edge rows that have not been written yet. Edge rows are
+added as they are inserted and write() adds the counts to the rollup tables,
+in the same transaction as the rows. """
+class RollupCounts(object):
+    def __init__(self):
+        self.pairs = {}
+        self.users = {}
+        self.days = {}
+        self.names = {} # normalized form of each (name, ascii_only)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def normalized(self, name, ascii_only):
+        key = (name, ascii_only)
+        if key not in self.names:
+            self.names[key] = normalize(name, ascii_only)
+        return self.names[key]
+
+    """ Counts an edge row (start_node, end_node, time_created) of an edge
+    table (e.g. 'mentions_edges'). """
+    def add(self, table, row):
+        interaction_type = table[:-len('_edges')]
+        start_node = self.normalized(row[0], False)
+        end_node = self.normalized(row[1], True)
+        pair = (interaction_type, start_node, end_node)
+        self.pairs[pair] = self.pairs.get(pair, 0) + 1
+        for user, column in [(start_node, 0), (end_node, 1)]:
+            counts = self.users.setdefault((interaction_type, user), [0, 0])
+            counts[column] += 1
+        day = (interaction_type, str(row[2])[:10])
+        self.days[day] = self.days.get(day, 0) + 1
+
+    """ Yields the rows of an iterator of edge rows of a table, counting each
+    one, so rows can be counted as they are inserted. """
+    def track(self, table, rows):
+        for row in rows:
+            self.add(table, row)
+            yield row
+
+    """ Adds the counts to the rollup tables with a cursor of connection,
+    without committing. """
+    def write(self, cursor, connection):
+        rows = {'edge_pair_counts': [key + (count,) for key, count in self.pairs.items()],
+                'user_counts': [key + tuple(counts) for key, counts in self.users.items()],
+                'daily_counts': [key + (count,) for key, count in self.days.items()]}
+        for table in sorted(ROLLUPS.keys()):
+            keys, columns = ROLLUPS[table]
+            sql = storage.prepare(storage.upsert_sql(table, keys, columns, True, connection), connection)
+            for i in range(0, len(rows[table]), BATCH_SIZE):
+                cursor.executemany(sql, rows[table][i:i + BATCH_SIZE])
+
+""" Returns the rollups of an interaction type recomputed from its edge table,
+as three dataframes with the columns of edge_pair_counts, user_counts and
+daily_counts (without interaction_type). """
+def compute_rollups(interaction_type):
+    pairs = util.get_weighted_edge_list(interaction_type)
+    out_counts = pairs.groupby('start_node')['weight'].sum()
+    in_counts = pairs.groupby('end_node')['weight'].sum()
+    users = pd.DataFrame({'out_count': out_counts, 'in_count': in_counts}).fillna(0).astype(np.int64)
+    users.index.name = 'name'
+    users = users.reset_index()[['name', 'out_count', 'in_count']]
+    with storage.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT DATE(`time_created`), COUNT(*) FROM {}_edges GROUP BY DATE(`time_created`)".format(interaction_type))
+            days = pd.DataFrame([(str(day)[:10], count) for day, count in cursor.fetchall()], columns=['day', 'count'])
+        connection.commit()
+    days = days.groupby('day', as_index=False)['count'].sum()
+    return {'edge_pair_counts': pairs, 'user_counts': users, 'daily_counts': days}
+
+""" Returns the rows of a rollup table for an interaction type as a dataframe
+with its columns other than interaction_type. """
+def get_rollup(table, interaction_type):
+    keys, columns = ROLLUPS[table]
+    names = keys[1:] + columns
+    with storage.connection() as connection:
+        with connection.streaming_cursor() as cursor:
+            cursor.execute("SELECT {} FROM `{}` WHERE `interaction_type` = %s".format(', '.join('`{}`'.format(name) for name in names), table), (interaction_type,))
+            rows = [row for batch in storage.fetch_batches(cursor) for row in batch]
+        connection.commit()
+    rollup = pd.DataFrame(rows, columns=names)
+    if table == 'daily_counts':
+        rollup['day'] = [str(day)[:10] for day in rollup['day']]
+    for column in columns:
+        rollup[column] = rollup[column].astype(np.int64)
+    return rollup
+
+""" Returns the distinct edges of an interaction type with a weight column,
+like graph_utils.get_weighted_edge_list, read from the edge_pair_counts
+rollup. """
+def get_weighted_edge_list(interaction_type):
+    return get_rollup('edge_pair_counts', interaction_type)
+
+""" Returns the total weight in the edge_pair_counts rollup of an interaction
+type, which equals the number of rows of its edge table while the rollup is up
+to date. """
+def get_total(interaction_type):
+    with storage.connection() as connection:
+        create_tables(connection)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT SUM(`weight`) FROM `edge_pair_counts` WHERE `interaction_type` = %s", (interaction_type,))
+            total = cursor.fetchone()[0]
+        connection.commit()
+    return int(total or 0)
+
+""" Replaces the rollups of an interaction type with ones recomputed from its
+edge table, in one transaction. """
+def rebuild(interaction_type):
+    rollups = compute_rollups(interaction_type)
+    with storage.connection() as connection:
+        create_tables(connection)
+        with connection.cursor() as cursor:
+            for table in sorted(ROLLUPS.keys()):
+                keys, columns = ROLLUPS[table]
+                cursor.execute("DELETE FROM `{}` WHERE `interaction_type` = %s".format(table), (interaction_type,))
+                sql = "INSERT INTO `{}` ({}) VALUES ({})".format(table, ', '.join('`{}`'.format(name) for name in keys + columns), ', '.join(['%s'] * len(keys + columns)))
+                rows = [(interaction_type,) + tuple(row) for row in rollups[table][keys[1:] + columns].values.tolist()]
+                for i in range(0, len(rows), BATCH_SIZE):
+                    cursor.executemany(sql, rows[i:i + BATCH_SIZE])
+        connection.commit()
+    return dict((table, len(rollup)) for table, rollup in rollups.items())
+
+""" Compares the rollups of an interaction type with ones recomputed from its
+edge table. Returns a dictionary mapping each rollup table to the number of
+rows that are missing from it, that it has but should not, and whose counts
+differ. """
+def check(interaction_type):
+    expected = compute_rollups(interaction_type)
+    differences = {}
+    for table in sorted(ROLLUPS.keys()):
+        keys, columns = ROLLUPS[table]
+        stored = get_rollup(table, interaction_type)
+        for key in keys[1:]: # an empty table's keys may not be objects
+            expected[table][key] = expected[table][key].astype(object)
+            stored[key] = stored[key].astype(object)
+        merged = pd.merge(expected[table], stored, on=keys[1:], how='outer', suffixes=('_expected', '_stored'), indicator=True)
+        both = merged['_merge'] == 'both'
+        differ = np.zeros(len(merged), dtype=bool)
+        for column in columns:
+            differ |= both & (merged[column + '_expected'] != merged[column + '_stored']).values
+        differences[table] = {'missing': int((merged['_merge'] == 'left_only').sum()),
+                              'extra': int((merged['_merge'] == 'right_only').sum()),
+                              'different': int(differ.sum())}
+    return differences
+
+def main():
+    command = sys.argv[1]
+    interaction_types = sys.argv[2:] or storage.EDGE_TYPES
+    consistent = True
+    for interaction_type in interaction_types:
+        if command == 'rebuild':
+            for table, num_rows in sorted(rebuild(interaction_type).items()):
+                print('{} {}: {} rows'.format(interaction_type, table, num_rows))
+        elif command == 'check':
+            for table, counts in sorted(check(interaction_type).items()):
+                consistent = consistent and sum(counts.values()) == 0
+                print('{} {}: {} missing, {} extra, {} different'.format(interaction_type, table, counts['missing'], counts['extra'], counts['different']))
+        else:
+            raise ValueError('Unknown command {}'.format(command))
+    if not consistent:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+temporal_graph.py
+
+Description: Produces a sequence of interaction graphs over sliding time windows
+(e.g. 30 days, moved forward 1 day at a time). Each window's graph is derived
+from the previous one by adding the edges that enter the window and removing the
+ones that leave it.
+
+Usage: python temporal_graph.py <interaction type> [<window days> [<step days>]]
+Writes PageRank leaders, category degrees and sizes of every window to
+<interaction type>_windows.csv.
+"""
+import csr_graph
+import csv
+import graph_utils as util
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+import sys
+
+WINDOW = pd.Timedelta(days=30)
+STEP = pd.Timedelta(days=1)
+
+""" The edges of an interaction type sorted by time, with users numbered by a
+single index shared by every window. """
+class TemporalGraph(object):
+    """ Creates a temporal graph from an edge list with a time_created column
+    (see graph_utils.get_edge_list with with_times). Self-referencing edges are
+    dropped, as in graph_creator.create_graph_edge_weights. """
+    def __init__(self, edge_list):
+        start_nodes = edge_list['start_node'].values
+        end_nodes = edge_list['end_node'].values
+        # Don't include self-referencing edges
+        keep = start_nodes != end_nodes
+        times = pd.to_datetime(edge_list['time_created']).values[keep]
+        order = np.argsort(times, kind='mergesort')
+        num_edges = len(order)
+        # Interleave so nodes are numbered in the order they first appear
+        endpoints = np.empty(2 * num_edges, dtype=object)
+        endpoints[0::2] = start_nodes[keep][order]
+        endpoints[1::2] = end_nodes[keep][order]
+        codes, names = pd.factorize(endpoints)
+        self.names = list(names)
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.start_ids = codes[0::2].astype(np.int64)
+        self.end_ids = codes[1::2].astype(np.int64)
+        self.times = times[order]
+
+    """ Returns the temporal graph of an interaction type from the database. """
+    @classmethod
+    def from_database(cls, interaction_type):
+        return cls(util.get_edge_list(interaction_type, with_times=True))
+
+    def number_of_nodes(self):
+        return len(self.names)
+
+    """ Yields a WindowGraph for each window of the given length (a
+    pd.Timedelta or anything it accepts, e.g. '30D'), moved forward by step,
+    from start (the first edge's day by default) until a window starts after
+    end (the last edge's time by default). The same WindowGraph is updated in
+    place for each window, touching only the edges that enter or leave it. """
+    def windows(self, window=WINDOW, step=STEP, start=None, end=None, categories=None):
+        window = pd.Timedelta(window)
+        step = pd.Timedelta(step)
+        if len(self.times) == 0:
+            return
+        start = pd.Timestamp(start) if start is not None else pd.Timestamp(self.times[0]).floor('D')
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp(self.times[-1])
+        snapshot = WindowGraph(self, categories)
+        while start <= end:
+            snapshot.move_to(start, start + window)
+            yield snapshot
+            start += step
+
+""" The weighted graph of the edges of a TemporalGraph with start <= time_created
+< end. Edge weights and weighted degrees are kept up to date as the window
+moves. Given categories, a dictionary mapping names to lists of users, the
+weighted in-degree from and out-degree to each category are kept as well, as in
+degree_vectors.degrees_into_database. """
+class WindowGraph(object):
+    def __init__(self, temporal, categories=None):
+        self.temporal = temporal
+        self.names = temporal.names
+        num_nodes = len(self.names)
+        self.start = None
+        self.end = None
+        self.first = 0 # edges first:last of temporal are in the window
+        self.last = 0
+        self.weights = {} # weight of each edge, keyed by start_id * num_nodes + end_id
+        self.out_degrees = np.zeros(num_nodes, dtype=np.int64)
+        self.in_degrees = np.zeros(num_nodes, dtype=np.int64)
+        self.category_masks = {}
+        self.in_degrees_from = {}
+        self.out_degrees_to = {}
+        for category, users in (categories or {}).items():
+            mask = np.zeros(num_nodes, dtype=bool)
+            mask[[temporal.index[user] for user in users if user in temporal.index]] = True
+            self.category_masks[category] = mask
+            self.in_degrees_from[category] = np.zeros(num_nodes, dtype=np.int64)
+            self.out_degrees_to[category] = np.zeros(num_nodes, dtype=np.int64)
+
+    """ Moves the window to [start, end), removing the edges that leave it and
+    adding the ones that enter it. Edges are sorted by time, so both sets are
+    contiguous ranges found by binary search. """
+    def move_to(self, start, end):
+        times = self.temporal.times
+        first = np.searchsorted(times, np.datetime64(start), side='left')
+        last = np.searchsorted(times, np.datetime64(end), side='left')
+        if first >= self.last or last <= self.first: # windows do not overlap
+            self.update(self.first, self.last, -1)
+            self.update(first, last, 1)
+        else:
+            if first > self.first:
+                self.update(self.first, first, -1)
+            elif first < self.first:
+                self.update(first, self.first, 1)
+            if last > self.last:
+                self.update(self.last, last, 1)
+            elif last < self.last:
+                self.update(last, self.last, -1)
+        self.first = first
+        self.last = last
+        self.start = start
+        self.end = end
+
+    """ Adds (sign 1) or removes (sign -1) the edges first:last of the temporal
+    graph. """
+    def update(self, first, last, sign):
+        if last <= first:
+            return
+        start_ids = self.temporal.start_ids[first:last]
+        end_ids = self.temporal.end_ids[first:last]
+        np.add.at(self.out_degrees, start_ids, sign)
+        np.add.at(self.in_degrees, end_ids, sign)
+        for category, mask in self.category_masks.items():
+            from_category = mask[start_ids]
+            np.add.at(self.in_degrees_from[category], end_ids[from_category], sign)
+            to_category = mask[end_ids]
+            np.add.at(self.out_degrees_to[category], start_ids[to_category], sign)
+        pairs, counts = np.unique(start_ids * len(self.names) + end_ids, return_counts=True)
+        weights = self.weights
+        for pair, count in zip(pairs.tolist(), (sign * counts).tolist()):
+            weight = weights.get(pair, 0) + count
+            if weight == 0:
+                del weights[pair]
+            else:
+                weights[pair] = weight
+
+    def number_of_edges(self):
+        return len(self.weights)
+
+    """ Returns the number of users with at least one edge in the window. """
+    def number_of_active_nodes(self):
+        return int(((self.out_degrees > 0) | (self.in_degrees > 0)).sum())
+
+    """ Returns the window's graph as a csr_graph.CSRGraph over all users of
+    the temporal graph; use its compact() method to drop inactive users. """
+    def to_csr(self):
+        num_nodes = len(self.names)
+        pairs = np.fromiter(self.weights.keys(), dtype=np.int64, count=len(self.weights))
+        weights = np.fromiter(self.weights.values(), dtype=np.int64, count=len(self.weights))
+        return csr_graph.CSRGraph.from_matrix(self.names, sparse.csr_matrix((weights, (pairs // num_nodes, pairs % num_nodes)), shape=(num_nodes, num_nodes)), self.temporal.index)
+
+    """ Returns an array with the PageRank of every user in the window's graph
+    (0 for users with no edges in the window). """
+    def pagerank(self):
+        active = (self.out_degrees > 0) | (self.in_degrees > 0)
+        values = np.zeros(len(self.names))
+        if active.any():
+            g = self.to_csr().compact()
+            values[active] = g.pagerank()
+        return values
+
+    """ Returns a dataframe with the degree vector of each active user: its
+    category degrees (see the categories given to the temporal graph) and total
+    out-degree. """
+    def degree_vectors(self):
+        active = np.flatnonzero((self.out_degrees > 0) | (self.in_degrees > 0))
+        columns = {'name': np.array(self.names, dtype=object)[active], 't_outdeg': self.out_degrees[active]}
+        for category in sorted(self.category_masks.keys()):
+            columns['{}_indeg'.format(category)] = self.in_degrees_from[category][active]
+            columns['{}_outdeg'.format(category)] = self.out_degrees_to[category][active]
+        return pd.DataFrame(columns)
+
+    """ Returns the cluster statistics (see csr_graph.CSRGraph.cluster_stats) of
+    the window's graph for a dictionary mapping users to clusters. """
+    def cluster_stats(self, clusters):
+        labels = np.full(len(self.names), -1, dtype=np.int64)
+        for user, cluster in clusters.items():
+            if user in self.temporal.index:
+                labels[self.temporal.index[user]] = cluster
+        return self.to_csr().cluster_stats(labels)
+
+def main():
+    interaction_type = sys.argv[1]
+    window = pd.Timedelta(days=int(sys.argv[2])) if len(sys.argv) > 2 else WINDOW
+    step = pd.Timedelta(days=int(sys.argv[3])) if len(sys.argv) > 3 else STEP
+    c_list, m_list, p_list = util.get_lists()
+    categories = {'c': c_list, 'm': m_list, 'p': p_list}
+    temporal = TemporalGraph.from_database(interaction_type)
+    with open('{}_windows.csv'.format(interaction_type), 'wb') as csv_file:
+        writer = csv.writer(csv_file, lineterminator='\n')
+        writer.writerow(['window_start', 'window_end', 'num_edges', 'num_active_nodes', 'top_pagerank', 'c_indeg', 'm_indeg', 'p_indeg'])
+        for snapshot in temporal.windows(window, step, categories=categories):
+            pagerank = snapshot.pagerank()
+            top = temporal.names[pagerank.argmax()] if snapshot.number_of_edges() > 0 else ''
+            writer.writerow([snapshot.start, snapshot.end, snapshot.number_of_edges(), snapshot.number_of_active_nodes(), top] +
+                            [snapshot.in_degrees_from[category].sum() for category in ['c', 'm', 'p']])
+
+if __name__ == "__main__":
+    main()
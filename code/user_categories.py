@@ -0,0 +1,129 @@
+"""
+user_categories.py
+
+Description: A registry of the celebrities, media outlets and politicians, built
+once from the database lists and the labeled list files, for constant-time
+category lookups and vectorized labeling of arrays of usernames.
+"""
+import cPickle as pickle
+import graph_utils as util
+import hashlib
+import numpy as np
+import os
+import pandas as pd
+import re
+
+CACHE_FILE = 'user_categories.pkl'
+CATEGORIES = ['c', 'm', 'p', 'o'] # code i is CATEGORIES[i], in the order of node_lists
+PRECEDENCE = ['c', 'p', 'm'] # for users in more than one list
+COUNT_SUFFIXES = {'k': 1e3, 'm': 1e6, 'b': 1e9}
+
+""" Returns a follower or following count from the labeled list files (e.g.
+'93 369 751', 'Followers 30,936,311' or '1.2M') as a float, or NaN. """
+def parse_count(text):
+    if not isinstance(text, basestring):
+        return np.nan
+    match = re.search(r'(\d[\d.,]*)\s*([kKmMbB])\b', text)
+    if match is not None:
+        return float(match.group(1).replace(',', '')) * COUNT_SUFFIXES[match.group(2).lower()]
+    digits = re.sub(r'\D', '', text)
+    return float(digits) if digits else np.nan
+
+""" Users in each category with the information from the labeled list files.
+A user in several lists gets the category that comes first in precedence
+(PRECEDENCE by default, as in the per-user loops this replaces). """
+class UserCategories(object):
+    def __init__(self, c_list, m_list, p_list, c_df=None, m_df=None, p_df=None, precedence=PRECEDENCE):
+        lists = {'c': c_list, 'm': m_list, 'p': p_list}
+        self.precedence = precedence
+        self.members = dict((category, set(users)) for category, users in lists.items())
+        self.category = {}
+        for category in reversed(precedence):
+            for user in lists[category]:
+                self.category[user] = category
+        self.users = pd.Index(sorted(self.category.keys()))
+        self.user_codes = np.array([CATEGORIES.index(self.category[user]) for user in self.users], dtype=np.int8)
+        self.info = self.merge_info({'c': c_df, 'm': m_df, 'p': p_df})
+
+    """ Returns one dataframe indexed by user with the Name, Description,
+    Affiliation and parsed Followers and Following counts of every user, taking
+    each user's row from the list file of its category. """
+    def merge_info(self, dfs):
+        columns = ['Name', 'Description', 'Affiliation', 'Followers', 'Following']
+        frames = []
+        for category in self.precedence:
+            df = dfs[category]
+            if df is None:
+                continue
+            df = df.drop_duplicates('User').set_index('User')
+            df = df.reindex(columns=columns)
+            df['Followers'] = df['Followers'].map(parse_count)
+            df['Following'] = df['Following'].map(parse_count)
+            frames.append(df[[self.category.get(user) == category for user in df.index]])
+        if len(frames) == 0:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames)
+
+    """ Returns the registry built from graph_utils.get_lists and
+    get_list_dfs. """
+    @classmethod
+    def from_database(cls):
+        c_list, m_list, p_list = util.get_lists()
+        c_df, m_df, p_df = util.get_list_dfs()
+        return cls(c_list, m_list, p_list, c_df, m_df, p_df)
+
+    """ Returns the registry saved in path, or builds it from the database and
+    saves it there if the file is missing, refresh is True, or the lists have
+    changed since it was saved (checked by a hash of the database lists and the
+    modification times of the labeled list files). """
+    @classmethod
+    def load(cls, path=CACHE_FILE, refresh=False):
+        lists = util.get_lists()
+        key = hashlib.sha1(repr([lists, [os.path.getmtime(f) if os.path.exists(f) else None for f in util.LABELED_LIST_FILES]])).hexdigest()
+        if not refresh and os.path.exists(path):
+            with open(path, 'rb') as f:
+                saved_key, registry = pickle.load(f)
+            if saved_key == key:
+                return registry
+        c_df, m_df, p_df = util.get_list_dfs()
+        registry = cls(lists[0], lists[1], lists[2], c_df, m_df, p_df)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((key, registry), f, pickle.HIGHEST_PROTOCOL)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+        return registry
+
+    """ Returns the category of a user: 'c', 'm', 'p', or 'o' for others. """
+    def get(self, user):
+        return self.category.get(user, 'o')
+
+    """ Returns an int8 array with the category code (an index into CATEGORIES)
+    of each user in an array of usernames. """
+    def codes(self, users):
+        positions = self.users.get_indexer(np.asarray(users, dtype=object))
+        codes = np.full(len(positions), CATEGORIES.index('o'), dtype=np.int8)
+        found = positions >= 0
+        codes[found] = self.user_codes[positions[found]]
+        return codes
+
+    """ Returns an array with the category letter of each user in an array of
+    usernames. """
+    def types(self, users):
+        return np.array(CATEGORIES, dtype=object)[self.codes(users)]
+
+    """ Returns a boolean array with a row per user and a column per category
+    in 'c', 'm', 'p' order, marking every list a user is in (a user may be in
+    more than one). """
+    def membership(self, users):
+        users = pd.Series(np.asarray(users, dtype=object))
+        matrix = np.zeros((len(users), 3), dtype=bool)
+        for j, category in enumerate(CATEGORIES[:3]):
+            matrix[:, j] = users.isin(self.members[category]).values
+        return matrix
+
+    """ Returns the rows of the list file information for an array of
+    usernames, with NaN for users in no list. """
+    def user_info(self, users):
+        return self.info.reindex(np.asarray(users, dtype=object))
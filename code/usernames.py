@@ -0,0 +1,98 @@
+"""
+usernames.py
+
+Description: Normalizes usernames (and hashtags) read from the database and
+maps each distinct name to a stable integer id, kept in a file so that ids are
+the same across runs and edge tables can be loaded as int32 arrays.
+"""
+import fcntl
+import numpy as np
+import os
+import pandas as pd
+
+ID_FILE = 'username_ids.txt'
+
+""" Returns a name as a lowercase str, the way graph_utils has always
+normalized start nodes. """
+def normalize_name(name):
+    return str(name).lower()
+
+""" Returns a name as a lowercase str with non-ASCII characters dropped, the
+way graph_utils has always normalized end nodes. """
+def normalize_ascii_name(name):
+    if isinstance(name, unicode):
+        name = name.encode('ascii', 'ignore')
+    return str(name).lower()
+
+""" Returns an object array with the normalized form of each name in an array.
+Each distinct name is normalized once, so the work depends on the number of
+distinct names rather than the number of rows. Missing names (None or NaN)
+become 'none', so every edge keeps two named endpoints; the per-row code this
+replaced gave 'none' or 'nan' for start nodes and left end nodes missing. """
+def normalize_names(names, ascii_only=False):
+    codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+    normalize = normalize_ascii_name if ascii_only else normalize_name
+    normalized = np.array([normalize(name) for name in uniques] + [normalize(None)], dtype=object)
+    return normalized[codes] # code -1 (None or NaN) picks the last entry
+
+""" A table of distinct names, where the id of a name is its position. New
+names are appended, so ids never change. The table is stored as a text file
+with one name per line, and save() only appends the names added since the last
+save. The file is locked while it is read or appended to, so several processes
+can share it. """
+class UsernameTable(object):
+    def __init__(self, path=ID_FILE):
+        self.path = path
+        self.names = []
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                self.names = f.read().splitlines()
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.num_saved = len(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    """ Returns the id of a name, adding it to the table if it is new. """
+    def intern(self, name):
+        i = self.index.get(name)
+        if i is None:
+            i = len(self.names)
+            self.index[name] = i
+            self.names.append(name)
+        return i
+
+    """ Returns an int32 array with the id of each name in an array of
+    normalized names, adding the new ones. """
+    def ids(self, names):
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        unique_ids = np.array([self.intern(name) for name in uniques], dtype=np.int32)
+        return unique_ids[codes]
+
+    """ Returns an object array with the name of each id in an array. """
+    def lookup(self, ids):
+        return np.array(self.names, dtype=object)[ids]
+
+    """ Appends the names added since the last save to the table's file. Names
+    that other processes appended in the meantime are read first and keep
+    their ids, so the names added here may move to later ids. Returns an int32
+    array mapping every id handed out before the save to the name's id after
+    it. """
+    def save(self):
+        remap = np.arange(len(self.names), dtype=np.int32)
+        if self.path is None or self.num_saved == len(self.names):
+            return remap
+        with open(self.path, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            saved = f.read().splitlines()
+            added = self.names[self.num_saved:]
+            self.names = saved[:]
+            self.index = dict((name, i) for i, name in enumerate(self.names))
+            remap[self.num_saved:] = [self.intern(name) for name in added]
+            for name in self.names[len(saved):]:
+                f.write(name + '\n')
+            f.flush()
+        self.num_saved = len(self.names)
+        return remap